@@ -85,6 +85,7 @@ print('''
                     "conversation_history": [],
                     "active_file": None,
                     "combined_df": None,
+                    "_combined_dirty": False,
                     "last_generated_file": None,
                     "generated_files_history": []
                 }
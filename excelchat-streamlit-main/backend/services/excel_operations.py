@@ -14,11 +14,12 @@ import time
 import json
 import re
 import sys
+import threading
+from collections import OrderedDict
 import google.generativeai as genai
 
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.table import Table, TableStyleInfo
 
 # Import configuration
@@ -26,9 +27,12 @@ backend_path = Path(__file__).resolve().parent.parent
 if str(backend_path) not in sys.path:
     sys.path.insert(0, str(backend_path))
 from config.settings import settings, error_messages
+from .hashing import fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Number of recent LLM responses kept by ExcelOperationIntentParser
+LLM_RESPONSE_CACHE_SIZE = 512
 
 class ExcelOperations:
     """
@@ -101,16 +105,19 @@ class ExcelOperations:
             ws = wb.active
             ws.title = "Data"
             
-            # Write DataFrame to worksheet
-            for r_idx, row in enumerate(dataframe_to_rows(processed_df, index=False, header=True), 1):
-                for c_idx, value in enumerate(row, 1):
-                    cell = ws.cell(row=r_idx, column=c_idx, value=value)
-                    
-                    # Apply header formatting
-                    if r_idx == 1:
-                        cell.font = Font(bold=True, color='FFFFFFFF')
-                        cell.fill = PatternFill(start_color='FF4472C4', end_color='FF4472C4', fill_type='solid')
-                        cell.alignment = Alignment(horizontal='center', vertical='center')
+            # Write DataFrame to worksheet - one append per row, values straight from itertuples
+            ws.append(list(processed_df.columns))
+            for row in processed_df.itertuples(index=False, name=None):
+                ws.append(row)
+            
+            # Apply header formatting
+            header_font = Font(bold=True, color='FFFFFFFF')
+            header_fill = PatternFill(start_color='FF4472C4', end_color='FF4472C4', fill_type='solid')
+            header_alignment = Alignment(horizontal='center', vertical='center')
+            for cell in ws[1]:
+                cell.font = header_font
+                cell.fill = header_fill
+                cell.alignment = header_alignment
             
             # Apply formatting operations (highlighting, conditional formatting)
             self._apply_formatting_operations(ws, processed_df, operations)
@@ -309,7 +316,6 @@ class ExcelOperations:
         Create Excel file while preserving original formatting from source file
         """
         from openpyxl import load_workbook
-        from openpyxl.utils.dataframe import dataframe_to_rows
         from copy import copy
         
         # Load the original workbook to preserve formatting
@@ -372,17 +378,19 @@ class ExcelOperations:
             ws.delete_rows(data_start_row, ws.max_row - data_start_row + 1)
         
         # Write new data starting from data_start_row
-        for r_idx, row_data in enumerate(dataframe_to_rows(processed_df, index=False, header=False), start=data_start_row):
+        # (style setters store by value in the workbook, so the saved formats are shared, not copied per cell)
+        cell_at = ws.cell
+        for r_idx, row_data in enumerate(processed_df.itertuples(index=False, name=None), start=data_start_row):
             for c_idx, value in enumerate(row_data, start=1):
-                cell = ws.cell(row=r_idx, column=c_idx, value=value)
+                cell = cell_at(row=r_idx, column=c_idx, value=value)
                 
                 # Apply original data formatting if available
-                if c_idx in original_data_formats:
-                    fmt = original_data_formats[c_idx]
-                    cell.font = copy(fmt['font'])
-                    cell.fill = copy(fmt['fill'])
-                    cell.border = copy(fmt['border'])
-                    cell.alignment = copy(fmt['alignment'])
+                fmt = original_data_formats.get(c_idx)
+                if fmt:
+                    cell.font = fmt['font']
+                    cell.fill = fmt['fill']
+                    cell.border = fmt['border']
+                    cell.alignment = fmt['alignment']
                     cell.number_format = fmt['number_format']
         
         # Apply new formatting operations (highlighting, etc.) on top of preserved formatting
@@ -1039,6 +1047,41 @@ class ExcelOperationIntentParser:
     
     def __init__(self, llm_model):
         self.model = llm_model
+        
+        # LRU cache of response texts keyed by a hash of (model, generation config, prompt)
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+    
+    def generate_text(self, prompt: str, temperature: float, top_p: float, top_k: int) -> str:
+        """
+        Generate a response with the LLM, reusing the cached text for an identical prompt
+        Prompts embed the data shape/columns, so a different schema never shares an entry
+        """
+        model_name = getattr(self.model, "model_name", "")
+        cache_key = fingerprint(f"{model_name}|{temperature}|{top_p}|{top_k}|{prompt}".encode("utf-8"))
+        
+        with self._response_cache_lock:
+            cached_text = self._response_cache.get(cache_key)
+            if cached_text is not None:
+                self._response_cache.move_to_end(cache_key)
+                logger.info("⚡ Reusing cached LLM response")
+                return cached_text
+        
+        response = self.model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=temperature,
+                top_p=top_p,
+                top_k=top_k
+            )
+        )
+        response_text = response.text
+        
+        with self._response_cache_lock:
+            self._response_cache[cache_key] = response_text
+            if len(self._response_cache) > LLM_RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+        return response_text
     
     def parse_intent(self, user_query: str, df: pd.DataFrame, conversation_history: list = None, last_generated_file: dict = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
         """
@@ -1169,17 +1212,14 @@ Respond with ONLY one word: "YES" (for Excel file operation) or "NO" (for text a
 """
         
         try:
-            import google.generativeai as genai
-            response = self.model.generate_content(
+            response_text = self.generate_text(
                 intent_detection_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,  # Low temperature for consistent classification
-                    top_p=0.8,
-                    top_k=10
-                )
+                temperature=0.1,  # Low temperature for consistent classification
+                top_p=0.8,
+                top_k=10
             )
             
-            result = response.text.strip().upper()
+            result = response_text.strip().upper()
             
             if "YES" in result:
                 logger.info(f"🎯 LLM detected EXCEL FILE operation for query: '{user_query[:50]}...'")
@@ -2510,17 +2550,12 @@ Generate the JSON specification:
 """
         
         try:
-            import google.generativeai as genai
-            response = self.model.generate_content(
+            response_text = self.generate_text(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_p=0.8,
-                    top_k=20
-                )
-            )
-            
-            response_text = response.text.strip()
+                temperature=0.1,
+                top_p=0.8,
+                top_k=20
+            ).strip()
             
             # Extract JSON from response
             import json
@@ -2653,16 +2688,12 @@ If everything is perfect, respond with:
 Perform your critical review now:
 """
             
-            response = self.model.generate_content(
+            response_text = self.generate_text(
                 validation_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_p=0.8,
-                    top_k=20
-                )
-            )
-            
-            response_text = response.text.strip()
+                temperature=0.1,
+                top_p=0.8,
+                top_k=20
+            ).strip()
             
             # Extract JSON from response
             if '```json' in response_text:
@@ -2785,8 +2816,6 @@ Generate the corrected operations:
         This is the KEY to making the system truly agentic and non-linear.
         """
         try:
-            import google.generativeai as genai
-            
             # Build context about last generated file
             last_file_context = "No previous file generated in this session"
             if last_generated_file:
@@ -2883,16 +2912,8 @@ Decision: "original_files" ("new file" indicates fresh start)
 Analyze the query and generate your decision:
 """
             
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_p=0.8,
-                    top_k=20
-                )
-            )
-            
-            response_text = response.text.strip()
+            # Same query, file and history tail -> same prompt, answered from the response cache
+            response_text = self.generate_text(prompt, temperature=0.1, top_p=0.8, top_k=20).strip()
             
             # Extract JSON
             if '```json' in response_text:
@@ -14,7 +14,7 @@ import matplotlib
 matplotlib.use('Agg')  # Non-interactive backend
 import matplotlib.pyplot as plt
 import seaborn as sns
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import PatternFill, Font, Alignment
 from openpyxl.utils.dataframe import dataframe_to_rows
 import base64
@@ -27,6 +27,18 @@ sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (10, 6)
 plt.rcParams['font.size'] = 10
 
+# Filtered results above this size (or any size without xlsxwriter) are streamed with a write-only workbook
+STREAMING_WRITE_ROW_THRESHOLD = 50_000
+# Rows converted to plain Python values at a time while streaming
+STREAMING_WRITE_CHUNK_ROWS = 10_000
+
+# pandas' default xlsx engine when installed; without it to_excel builds a full openpyxl workbook
+try:
+    import xlsxwriter  # noqa: F401
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
+
 
 class ExcelTools:
     """Tools for Excel data analysis, visualization, and modification"""
@@ -52,113 +64,8 @@ class ExcelTools:
         logger.info(f"📁 ExcelTools initialized - uploads: {self.uploads_dir}, outputs: {self.outputs_dir}")
         
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
-        """Return tool definitions for Gemini function calling"""
-        return [
-            {
-                "name": "generate_chart",
-                "description": "Generate a chart/visualization from Excel data. Supports bar, line, pie, scatter, histogram charts.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "filename": {
-                            "type": "string",
-                            "description": "Name of the Excel file to analyze"
-                        },
-                        "chart_type": {
-                            "type": "string",
-                            "enum": ["bar", "line", "pie", "scatter", "histogram", "box"],
-                            "description": "Type of chart to generate"
-                        },
-                        "x_column": {
-                            "type": "string",
-                            "description": "Column name for X-axis (or categories for pie chart)"
-                        },
-                        "y_column": {
-                            "type": "string",
-                            "description": "Column name for Y-axis (optional for some chart types)"
-                        },
-                        "title": {
-                            "type": "string",
-                            "description": "Title for the chart"
-                        },
-                        "aggregate": {
-                            "type": "string",
-                            "enum": ["count", "sum", "mean", "median", "min", "max"],
-                            "description": "Aggregation method if needed (default: count)"
-                        }
-                    },
-                    "required": ["filename", "chart_type", "x_column"]
-                }
-            },
-            {
-                "name": "modify_excel",
-                "description": "Modify an Excel file by highlighting rows, changing cell colors, or formatting data based on conditions.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "filename": {
-                            "type": "string",
-                            "description": "Name of the Excel file to modify"
-                        },
-                        "operation": {
-                            "type": "string",
-                            "enum": ["highlight_rows", "highlight_cells", "filter_data"],
-                            "description": "Type of modification to perform"
-                        },
-                        "column": {
-                            "type": "string",
-                            "description": "Column name to check for condition"
-                        },
-                        "condition_value": {
-                            "type": "string",
-                            "description": "Value to match for highlighting/filtering"
-                        },
-                        "color": {
-                            "type": "string",
-                            "enum": ["green", "red", "yellow", "blue", "orange"],
-                            "description": "Color for highlighting (default: green)"
-                        },
-                        "output_filename": {
-                            "type": "string",
-                            "description": "Name for the output file"
-                        }
-                    },
-                    "required": ["filename", "operation", "column", "condition_value"]
-                }
-            },
-            {
-                "name": "analyze_data",
-                "description": "Perform data analysis on Excel data: statistics, filtering, grouping, sorting.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "filename": {
-                            "type": "string",
-                            "description": "Name of the Excel file to analyze"
-                        },
-                        "operation": {
-                            "type": "string",
-                            "enum": ["statistics", "filter", "group_by", "sort", "unique_values"],
-                            "description": "Type of analysis to perform"
-                        },
-                        "column": {
-                            "type": "string",
-                            "description": "Column name for the operation"
-                        },
-                        "filter_value": {
-                            "type": "string",
-                            "description": "Value to filter by (if operation is filter)"
-                        },
-                        "aggregate_function": {
-                            "type": "string",
-                            "enum": ["count", "sum", "mean", "median", "min", "max"],
-                            "description": "Aggregation function for group_by"
-                        }
-                    },
-                    "required": ["filename", "operation"]
-                }
-            }
-        ]
+        """Return tool definitions for Gemini function calling (shared definitions - do not modify)"""
+        return list(_TOOL_DEFINITIONS)
     
     def generate_chart(self, filename: str, chart_type: str, x_column: str, 
                       y_column: Optional[str] = None, title: Optional[str] = None,
@@ -411,7 +318,11 @@ class ExcelTools:
                 condition = str(condition_value).strip().lower()
                 filtered_df = df[df[column].astype(str).str.lower().str.contains(condition, na=False)]
                 
-                filtered_df.to_excel(output_path, index=False)
+                if len(filtered_df) > STREAMING_WRITE_ROW_THRESHOLD or not XLSXWRITER_AVAILABLE:
+                    # Large result - stream rows instead of building the full cell tree
+                    self._write_dataframe_streaming(filtered_df, output_path)
+                else:
+                    filtered_df.to_excel(output_path, index=False)
                 logger.info(f"✅ Filtered {len(filtered_df)} rows to {output_filename}")
                 
                 return {
@@ -460,6 +371,22 @@ class ExcelTools:
             logger.error(f"Error modifying Excel: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
     
+    def _write_dataframe_streaming(self, df: pd.DataFrame, output_path: Path, sheet_name: str = "Sheet1"):
+        """Write DataFrame with an openpyxl write-only workbook (constant memory)"""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(sheet_name)
+        ws.append([str(col) for col in df.columns])
+        
+        # Blank out NaN/NaT the same way to_excel does, one chunk of rows at a time so only
+        # STREAMING_WRITE_CHUNK_ROWS rows are ever held as Python objects
+        for chunk_start in range(0, len(df), STREAMING_WRITE_CHUNK_ROWS):
+            chunk = df.iloc[chunk_start:chunk_start + STREAMING_WRITE_CHUNK_ROWS]
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                ws.append(row)
+        
+        wb.save(output_path)
+    
     def analyze_data(self, filename: str, operation: str, column: Optional[str] = None,
                     filter_value: Optional[str] = None, 
                     aggregate_function: str = "count") -> Dict[str, Any]:
@@ -500,9 +427,10 @@ class ExcelTools:
                 if column not in df.columns:
                     return {"success": False, "error": f"Column '{column}' not found"}
                 
+                # unique() keeps first-appearance order for the list; counts stay sorted by frequency
                 unique_vals = df[column].unique().tolist()
                 value_counts = df[column].value_counts().to_dict()
-                
+
                 return {
                     "success": True,
                     "operation": "unique_values",
@@ -567,3 +495,111 @@ class ExcelTools:
             logger.error(f"Error analyzing data: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
 
+
+# Tool definitions for Gemini function calling - built once at import time
+_TOOL_DEFINITIONS = (
+    {
+        "name": "generate_chart",
+        "description": "Generate a chart/visualization from Excel data. Supports bar, line, pie, scatter, histogram charts.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "filename": {
+                    "type": "string",
+                    "description": "Name of the Excel file to analyze"
+                },
+                "chart_type": {
+                    "type": "string",
+                    "enum": ["bar", "line", "pie", "scatter", "histogram", "box"],
+                    "description": "Type of chart to generate"
+                },
+                "x_column": {
+                    "type": "string",
+                    "description": "Column name for X-axis (or categories for pie chart)"
+                },
+                "y_column": {
+                    "type": "string",
+                    "description": "Column name for Y-axis (optional for some chart types)"
+                },
+                "title": {
+                    "type": "string",
+                    "description": "Title for the chart"
+                },
+                "aggregate": {
+                    "type": "string",
+                    "enum": ["count", "sum", "mean", "median", "min", "max"],
+                    "description": "Aggregation method if needed (default: count)"
+                }
+            },
+            "required": ["filename", "chart_type", "x_column"]
+        }
+    },
+    {
+        "name": "modify_excel",
+        "description": "Modify an Excel file by highlighting rows, changing cell colors, or formatting data based on conditions.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "filename": {
+                    "type": "string",
+                    "description": "Name of the Excel file to modify"
+                },
+                "operation": {
+                    "type": "string",
+                    "enum": ["highlight_rows", "highlight_cells", "filter_data"],
+                    "description": "Type of modification to perform"
+                },
+                "column": {
+                    "type": "string",
+                    "description": "Column name to check for condition"
+                },
+                "condition_value": {
+                    "type": "string",
+                    "description": "Value to match for highlighting/filtering"
+                },
+                "color": {
+                    "type": "string",
+                    "enum": ["green", "red", "yellow", "blue", "orange"],
+                    "description": "Color for highlighting (default: green)"
+                },
+                "output_filename": {
+                    "type": "string",
+                    "description": "Name for the output file"
+                }
+            },
+            "required": ["filename", "operation", "column", "condition_value"]
+        }
+    },
+    {
+        "name": "analyze_data",
+        "description": "Perform data analysis on Excel data: statistics, filtering, grouping, sorting.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "filename": {
+                    "type": "string",
+                    "description": "Name of the Excel file to analyze"
+                },
+                "operation": {
+                    "type": "string",
+                    "enum": ["statistics", "filter", "group_by", "sort", "unique_values"],
+                    "description": "Type of analysis to perform"
+                },
+                "column": {
+                    "type": "string",
+                    "description": "Column name for the operation"
+                },
+                "filter_value": {
+                    "type": "string",
+                    "description": "Value to filter by (if operation is filter)"
+                },
+                "aggregate_function": {
+                    "type": "string",
+                    "enum": ["count", "sum", "mean", "median", "min", "max"],
+                    "description": "Aggregation function for group_by"
+                }
+            },
+            "required": ["filename", "operation"]
+        }
+    }
+)
@@ -6,18 +6,41 @@ Implements complete DataFrame loading, intelligent profiling, and code generatio
 import os
 import json
 import logging
+import math
+import operator
+import re
+import shutil
 import pandas as pd
 import numpy as np
 import traceback
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
 import google.generativeai as genai
+import itertools
+import threading
+import time
+import types
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape as xml_escape
+from collections import OrderedDict
+from functools import lru_cache
+import matplotlib
+# Non-interactive backend for server-side chart rendering - selected once at import, before pyplot loads
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+plt.ioff()
 import seaborn as sns
 import io
 import base64
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.workbook.child import avoid_duplicate_name, INVALID_TITLE_REGEX
 
 # Suppress NumPy warnings that trigger Flask auto-reload
 warnings.filterwarnings('ignore', category=RuntimeWarning, module='numpy')
@@ -25,7 +48,8 @@ warnings.filterwarnings('ignore', message='Mean of empty slice')
 
 # Import Excel operations module
 from .excel_operations import ExcelOperations, ExcelOperationIntentParser
-from .multi_sheet_handler import handle_multi_sheet_operation
+from .hashing import new_hasher, fingerprint
+from .multi_sheet_handler import handle_multi_sheet_operation, _apply_operations_to_dataframe
 
 # Import configuration
 import sys
@@ -37,6 +61,395 @@ from config.settings import settings, error_messages
 
 logger = logging.getLogger(__name__)
 
+# Optional Numba acceleration for numeric scans.
+# A fixed on-disk cache dir lets every worker and Flask reload reuse compiled kernels.
+os.environ.setdefault('NUMBA_CACHE_DIR', str(settings.BACKEND_DIR / '.numba_cache'))
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+if NUMBA_AVAILABLE:
+    # Serial on purpose: sheets are optimized from several threads at once, and concurrent
+    # parallel regions abort the process under Numba's default workqueue threading layer
+    @numba.njit(cache=True)
+    def _int_range_kernel(values):
+        """Single-pass min/max over a non-empty integer array"""
+        lo = values[0]
+        hi = values[0]
+        for i in range(values.shape[0]):
+            lo = min(lo, values[i])
+            hi = max(hi, values[i])
+        return lo, hi
+    
+    # Pre-warm: load (or compile once) the kernel at import, not on the first upload
+    # The kernel is serial, so this starts no threading layer before a pre-fork server forks workers
+    try:
+        _int_range_kernel(np.zeros(1, dtype=np.int64))
+    except Exception as e:
+        logger.warning(f"⚠️ Numba kernel warm-up failed: {e}")
+
+
+def _int_column_range(values: np.ndarray):
+    """Return (min, max) of a non-empty integer array, JIT-compiled when Numba is installed"""
+    if NUMBA_AVAILABLE:
+        return _int_range_kernel(values)
+    return values.min(), values.max()
+
+# Candidate integer dtypes for downcasting, narrowest first
+INT_DOWNCAST_TYPES = (np.int8, np.int16, np.int32)
+
+# Approximate per-object overhead of a CPython str, used for memory estimates
+STR_OBJECT_OVERHEAD_BYTES = 49
+
+# Assumed size of one Python object cell beyond its pointer (str header + short payload)
+OBJECT_CELL_ESTIMATE_BYTES = 56
+
+# Upper bound on threads used to load/profile sheets (shared by all uploads)
+MAX_SHEET_WORKERS = 8
+
+# Threads running LLM summaries in the background while the result file is written
+SUMMARY_WORKERS = 4
+
+# Optional Gemini context caching (google-generativeai >= 0.7)
+try:
+    from google.generativeai import caching as genai_caching
+except ImportError:
+    genai_caching = None
+
+# Lifetime of the cached dataset prefix sent to Gemini
+GEMINI_CACHE_TTL_SECONDS = 30 * 60
+# Stop using a cached prefix this long before its server-side TTL runs out
+GEMINI_CACHE_EXPIRY_MARGIN_SECONDS = 60
+
+# File (in the uploads dir) remembering the last model that answered a real request
+LAST_GOOD_MODEL_FILENAME = ".last_good_model"
+
+# Optional Arrow-backed string storage for high-cardinality text columns
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Arrow-backed strings that mark missing cells with NaN, like object columns do - pd.NA would
+# reach the openpyxl writers, which cannot store it ("pyarrow_numpy" is the pandas 2.1/2.2 name)
+ARROW_STRING_DTYPE = None
+if PYARROW_AVAILABLE:
+    if int(pd.__version__.split(".")[0]) >= 3:
+        ARROW_STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+    else:
+        ARROW_STRING_DTYPE = "string[pyarrow_numpy]"
+
+# Optional Polars engine for column statistics on large frames (needs pyarrow)
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    pl = None
+    POLARS_AVAILABLE = False
+
+# Frames with at least this many rows get their profile stats from Polars
+POLARS_MIN_ROWS = 100_000
+
+# Optional Rust-backed Excel/ODS reader (python-calamine, pandas >= 2.2)
+try:
+    import python_calamine  # noqa: F401
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# Optional Rust-backed bulk xlsx writer for workbooks without formatting to carry over
+try:
+    from rustpy_xlsxwriter import FastExcel
+    FASTEXCEL_AVAILABLE = True
+except ImportError:
+    FastExcel = None
+    FASTEXCEL_AVAILABLE = False
+
+# Optional C-accelerated writer for plain (unstyled) pandas exports
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    xlsxwriter = None
+    XLSXWRITER_AVAILABLE = False
+
+# xlsxwriter options for value dumps: write cell text as-is, never as formulas or hyperlinks
+# (constant_memory is not usable through pandas - it writes cells column by column)
+XLSXWRITER_ENGINE_KWARGS = {"options": {"strings_to_formulas": False, "strings_to_urls": False}}
+
+# xlsxwriter options for _write_sheets_fast, which writes whole rows in order and can flush each one
+XLSXWRITER_STREAM_OPTIONS = {
+    **XLSXWRITER_ENGINE_KWARGS["options"],
+    "constant_memory": True,
+    "nan_inf_to_errors": True,
+    "default_date_format": "yyyy-mm-dd hh:mm:ss",  # pandas' to_excel datetime format
+}
+
+# File types read through calamine when it is installed
+CALAMINE_SUFFIXES = ('.xlsx', '.xlsm', '.xls', '.ods')
+
+# openpyxl options for workbooks we restyle and re-save: keep formulas/styles, skip external links
+XLSX_UPDATE_KWARGS = {"keep_links": False, "rich_text": False}
+
+# Summary statistics reported per numeric column in data profiles
+NUMERIC_PROFILE_STATS = ('min', 'max', 'mean', 'median', 'std')
+
+# Same-schema sheets are only profiled together (via one concatenated frame) up to this many
+# cells in total - beyond it the extra copy would outweigh the saved passes
+BATCH_STATS_MAX_CELLS = 2_000_000
+
+# Above this many rows, duplicate detection hashes rows instead of comparing them
+DUPLICATE_SCAN_MAX_ROWS = 500_000
+
+# Number of (dtype map, profile) entries kept for re-uploaded content
+PROFILE_CACHE_SIZE = 64
+
+# Number of normalized query -> simple/complex classifications kept (LRU)
+QUERY_INTENT_CACHE_SIZE = 1024
+
+# Number of code-generation responses kept, keyed by model + full prompt (LRU)
+GENERATED_CODE_CACHE_SIZE = 256
+
+# Number of compiled generated-code objects kept, keyed by source text (LRU)
+COMPILED_CODE_CACHE_SIZE = 512
+
+# Shape/column questions that are always "simple" - answered without an LLM classification call
+SIMPLE_QUERY_PATTERN = re.compile(
+    r"(how many (rows|columns|records|entries)( are there| do (we|i) have)?( in (the|this) (data|dataset|file|sheet))?"
+    r"|what are the columns?( names)?"
+    r"|(list|show)( me)?( all)?( the)? columns?( names)?"
+    r"|what is the (shape|size) of (the|this) (data|dataset|file|sheet))\??"
+)
+
+# Read size used when hashing uploaded files
+HASH_CHUNK_BYTES = 1 << 20
+
+# Subdirectory of outputs_dir holding Feather copies of generated workbooks' sheets (needs pyarrow)
+SHEET_CACHE_DIRNAME = "_cache"
+SHEET_CACHE_MANIFEST = "sheets.json"
+
+# Characters stripped from user-supplied names when building output filenames
+# (\w matches exactly str.isalnum() plus underscore, so this mirrors the old per-char filter)
+FILENAME_UNSAFE_CHARS = re.compile(r'[^\w-]')
+FILTER_VALUE_UNSAFE_CHARS = re.compile(r'[^\w ]')
+
+# Comparison operators accepted in filter / delete_rows / highlight conditions
+COMPARISON_OPERATORS = {
+    '==': operator.eq, '!=': operator.ne,
+    '>': operator.gt, '<': operator.lt,
+    '>=': operator.ge, '<=': operator.le,
+}
+
+# Characters Excel rejects in sheet names, and the file extension dropped from merged sheet names
+SHEET_NAME_INVALID_CHARS = re.compile(r'[\\/*?:\[\]]')
+SHEET_NAME_EXTENSION = re.compile(r'\.(?:xlsx|xls|csv)\Z')
+
+# Summary phrase per data operation applied to a multi-sheet file, in display order
+# (remove_last_row is a boolean flag; the others are present only when requested)
+UPDATE_OPERATION_DESCRIPTIONS = (
+    ('remove_last_row', "Removed last row"),
+    ('delete_rows', "Deleted rows"),
+    ('filter', "Filtered data"),
+    ('sort', "Sorted data"),
+)
+
+# Separators ignored when matching custom sheet names to uploaded filenames
+NAME_MATCH_STRIP = str.maketrans('', '', '_ ')
+
+# Fixed head of the merge-summary prompt; the merge details are appended after it
+MERGE_SUMMARY_PROMPT_PREFIX = """You are a helpful data assistant. Generate a brief, specific message about the file merge operation that was just completed.
+
+Instructions:
+1. Focus on the merge operation details
+2. Mention how many files were merged
+3. Mention that each file is in a separate tab/sheet
+4. Keep it brief (1-2 sentences)
+5. DO NOT use markdown formatting like ** or ###
+6. Use plain text only
+7. You can use emojis like ✅ 📊 📄
+8. DO NOT start with generic phrases like "Okay", "Done", "Ready", "Your file is ready"
+9. Start directly with the merge details
+
+Example format (N = files merged, R = total rows):
+- "✅ Merged N files into one workbook with separate tabs - R total rows."
+- "📊 Combined N files into separate sheets - R rows across all data."
+
+"""
+
+# Leading bytes of a ZIP container (xlsx), used to sniff .gsheet exports
+ZIP_MAGIC = b'PK\x03\x04'
+
+# Conversation history sent to the LLM: token budget, newest turns first, at most this many turns
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_MAX_TURNS = 20
+# Token budget for each answer preview inside the history
+HISTORY_ANSWER_TOKENS = 50
+# Rough characters-per-token ratio used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+# Optional local tokenizer for history budgeting
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """Load the tiktoken encoding once; None when tiktoken is missing or cannot load it"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️ tiktoken encoding unavailable, using character estimate: {e}")
+        return None
+
+def _count_tokens(text: str) -> int:
+    """Approximate LLM token count for text"""
+    encoding = _token_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+# Local variables of executed code reported as-is in results
+RESULT_VALUE_TYPES = (int, float, str, bool, list, dict)
+# Other locals are reported as str() when shorter than this
+RESULT_STR_MAX_CHARS = 1000
+# Imports and helper definitions left in executed code's locals - never reported
+RESULT_SKIPPED_TYPES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, type)
+# Builtin tuples/sets above this size always print longer than RESULT_STR_MAX_CHARS (>= 3 chars per item)
+RESULT_STR_MAX_ITEMS = RESULT_STR_MAX_CHARS // 3
+
+# Row highlight colors for formatted multi-sheet outputs (RGB hex)
+HIGHLIGHT_COLORS = {
+    'yellow': 'FFFF00',
+    'red': 'FF0000',
+    'green': '00FF00',
+    'blue': '0000FF',
+    'orange': 'FFA500',
+    'purple': '800080',
+    'pink': 'FFC0CB',
+    'cyan': '00FFFF',
+    'light_green': '90EE90',
+    'light_blue': 'ADD8E6',
+    'light_yellow': 'FFFFE0',
+    'light_red': 'FFB6C1',
+    'gray': '808080'
+}
+
+# Highlight colors for sheet operations - match Excel's conditional formatting colors (RGB hex)
+CONDITIONAL_FORMAT_COLORS = {
+    'red': 'FFC7CE', 'green': 'C6EFCE', 'yellow': 'FFFF99',  # Excel conditional format colors
+    'amber': 'FFEB9C',  # Excel amber/orange for RAG rating
+    'blue': '0000FF', 'orange': 'FFA500', 'purple': '800080',
+    'pink': 'FFC0CB', 'cyan': '00FFFF', 'light_green': '90EE90',
+    'light_blue': 'ADD8E6', 'light_yellow': 'FFFFE0',
+    'light_red': 'FFCCCB', 'gray': 'D3D3D3'
+}
+
+# Fill used on inserted subtotal rows
+SUBTOTAL_FILL_COLOR = 'FFE0E0E0'
+
+@lru_cache(maxsize=64)
+def _solid_fill(rgb_hex: str):
+    """Shared solid PatternFill per color - openpyxl stores cell styles by value, so one instance serves every cell"""
+    return PatternFill(start_color=rgb_hex, end_color=rgb_hex, fill_type='solid')
+
+# Marker printed by generated code in front of a chart's JSON config
+CHART_DATA_TAG = '[CHART_DATA]'
+
+# Shared decoder for chart configs; raw_decode reads one JSON value from an offset
+_CHART_DECODER = json.JSONDecoder()
+
+# Output file ids: a per-process counter seeded with the start time in ms, plus the zero-padded PID,
+# so concurrent requests (and worker processes) never pick the same filename
+# (the PID is read per call so workers forked after import still differ)
+_FILE_ID_COUNTER = itertools.count(int(time.time() * 1000))
+
+def _next_file_id() -> str:
+    """Unique all-digit id for an output filename (the frontend strips a trailing _<digits> for display)"""
+    return f"{next(_FILE_ID_COUNTER)}{os.getpid():07d}"
+
+def _count_png_files(directory: Path) -> int:
+    """Count .png files in a directory with one scandir pass (no per-entry Path objects)"""
+    with os.scandir(directory) as entries:
+        return sum(1 for entry in entries if entry.name.endswith('.png') and entry.is_file())
+
+def _xlsx_sheet_names(path: Path) -> List[str]:
+    """Sheet names of an .xlsx/.xlsm in tab order, read from xl/workbook.xml only (no styles/strings)"""
+    with zipfile.ZipFile(path) as archive, archive.open('xl/workbook.xml') as workbook_xml:
+        return [
+            element.get('name')
+            for _, element in ElementTree.iterparse(workbook_xml)
+            if element.tag.endswith('}sheet')
+        ]
+
+# <sheet .../> entries of xl/workbook.xml and their name attribute
+WORKBOOK_SHEET_TAG = re.compile(rb'<(?:\w+:)?sheet\s[^>]*>')
+WORKBOOK_SHEET_NAME_ATTR = re.compile(rb'(\sname=)(["\'])(.*?)\2')
+WORKBOOK_DEFINED_NAME_TAG = re.compile(rb'<(?:\w+:)?definedName[\s>]')
+
+def _rename_tabs_via_zip(src: Path, dst: Path, new_sheet_names: List[str]):
+    """
+    Write src to dst with its tabs renamed by editing only the name attributes in xl/workbook.xml
+    Every other part is copied as-is, so no cell data is parsed; raises ValueError when the
+    workbook has defined names (they reference sheets by name and would need rewriting too)
+    dst may be src - the result is built in a temp file beside dst and swapped in
+    """
+    dst = Path(dst)
+    tmp_path = dst.with_name(dst.name + '.tmp')
+    with zipfile.ZipFile(src) as zin:
+        workbook_xml = zin.read('xl/workbook.xml')
+        if WORKBOOK_DEFINED_NAME_TAG.search(workbook_xml):
+            raise ValueError("workbook has defined names")
+        
+        sheet_tags = WORKBOOK_SHEET_TAG.findall(workbook_xml)
+        if len(sheet_tags) != len(new_sheet_names):
+            raise ValueError(f"expected {len(new_sheet_names)} sheet entries, found {len(sheet_tags)}")
+        names = iter(new_sheet_names)
+        
+        def _rename(tag_match):
+            name = xml_escape(next(names), {'"': '&quot;'}).encode('utf-8')
+            return WORKBOOK_SHEET_NAME_ATTR.sub(lambda m: m.group(1) + b'"' + name + b'"', tag_match.group(0), count=1)
+        
+        workbook_xml = WORKBOOK_SHEET_TAG.sub(_rename, workbook_xml)
+        
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as zout:
+                for item in zin.infolist():
+                    zout.writestr(item, workbook_xml if item.filename == 'xl/workbook.xml' else zin.read(item.filename))
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+    os.replace(tmp_path, dst)
+
+class _ListWriter:
+    """Minimal stdout replacement for executed code - print() output is kept as a list of chunks"""
+    __slots__ = ('parts',)
+    
+    def __init__(self):
+        self.parts = []
+    
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        return len(text)
+    
+    def flush(self):
+        pass
+    
+    def isatty(self) -> bool:
+        return False
+    
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+# Element-wise "non-blank string" test used when scoring header rows
+_is_text_cell = np.frompyfunc(lambda val: isinstance(val, str) and bool(val.strip()), 1, 1)
+
 class FullDataAgent:
     """
     Complete agentic system that loads entire Excel files and provides
@@ -47,6 +460,11 @@ class FullDataAgent:
         self.api_key = api_key
         genai.configure(api_key=api_key)
         
+        # Copy-on-Write lets session sheets share frames without defensive copies
+        # (always on from pandas 3.0, where the option is deprecated)
+        if int(pd.__version__.split(".")[0]) < 3:
+            pd.set_option("mode.copy_on_write", True)
+        
         # Directory setup - use settings if not provided
         self.uploads_dir = Path(uploads_dir) if uploads_dir else settings.UPLOADS_DIR
         self.outputs_dir = Path(outputs_dir) if outputs_dir else settings.OUTPUTS_DIR
@@ -55,6 +473,7 @@ class FullDataAgent:
         
         # Initialize Gemini model
         self.model = None
+        self._model_verified = False
         self._initialize_model()
         
         # Initialize Excel operations
@@ -80,12 +499,40 @@ class FullDataAgent:
         #   "combined_df": DataFrame (if multiple files)
         # }
         
+        # Dtype map + profile per content hash, shared across sessions (LRU)
+        self._profile_cache: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._profile_cache_lock = threading.Lock()
+        
+        # Prompt fingerprint -> raw code-generation response (LRU)
+        self._code_response_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._code_response_cache_lock = threading.Lock()
+        
+        # Generated source -> compiled code object (LRU)
+        self._compiled_code_cache: "OrderedDict[str, types.CodeType]" = OrderedDict()
+        self._compiled_code_cache_lock = threading.Lock()
+        
+        # Worker threads for per-sheet load/optimize/profile, created once and reused across uploads
+        self._sheet_executor = ThreadPoolExecutor(
+            max_workers=min(MAX_SHEET_WORKERS, os.cpu_count() or 1),
+            thread_name_prefix="sheet-worker"
+        )
+        
+        # LLM summary calls that overlap with file writes; kept off the sheet pool so they never hold up sheet work
+        self._summary_executor = ThreadPoolExecutor(
+            max_workers=SUMMARY_WORKERS,
+            thread_name_prefix="summary-worker"
+        )
+        
+        # Normalized query -> "simple"/"complex"; independent of the loaded data (LRU)
+        self._intent_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._intent_cache_lock = threading.Lock()
+        
         # Configuration from settings
         self.MAX_FILE_SIZE = settings.get_max_file_size_bytes()
         self.MAX_ROWS_THRESHOLD = settings.MAX_ROWS_THRESHOLD
         
     def _initialize_model(self):
-        """Initialize Gemini model with fallbacks"""
+        """Initialize Gemini model with fallbacks (no network round-trip at startup)"""
         model_candidates = [
             "models/gemini-2.5-flash",
             "models/gemini-2.0-flash", 
@@ -93,14 +540,15 @@ class FullDataAgent:
             "models/gemini-pro"
         ]
         
+        # Try the model that last answered a real request first
+        last_good_model = self._read_last_good_model()
+        if last_good_model:
+            model_candidates = [last_good_model] + [c for c in model_candidates if c != last_good_model]
+        
         for candidate in model_candidates:
             try:
                 self.model = genai.GenerativeModel(candidate)
                 logger.info(f"✅ Full Data Agent initialized with: {candidate}")
-                
-                # Test the model
-                test_response = self.model.generate_content("Hello, respond with 'OK'")
-                logger.info(f"✅ Model test successful: {test_response.text[:20]}")
                 return  # Successfully initialized, exit the method
             except Exception as e:
                 logger.warning(f"⚠️ Failed to initialize '{candidate}': {e}")
@@ -109,34 +557,139 @@ class FullDataAgent:
         # If we get here, no model was successfully initialized
         raise Exception("❌ Could not initialize any Gemini model")
     
-    def _detect_header_row(self, file_path: Path) -> int:
+    def _read_last_good_model(self) -> Optional[str]:
+        """Read the model name persisted after the last successful LLM call"""
+        try:
+            return (self.uploads_dir / LAST_GOOD_MODEL_FILENAME).read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+    
+    def _remember_good_model(self):
+        """Persist the current model name once it has served a real request"""
+        if self._model_verified:
+            return
+        self._model_verified = True
+        try:
+            (self.uploads_dir / LAST_GOOD_MODEL_FILENAME).write_text(self.model.model_name, encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"⚠️ Could not persist last good model: {e}")
+    
+    def _open_excel_file(self, file_path) -> pd.ExcelFile:
         """
-        Detect the correct header row in an Excel file
+        Open a workbook for reading data only
+        Uses the Rust-backed calamine engine when installed; otherwise .xlsx goes through
+        openpyxl, which pandas already opens read-only/data-only so styles are never loaded
+        """
+        suffix = Path(file_path).suffix.lower()
+        if CALAMINE_AVAILABLE and suffix in CALAMINE_SUFFIXES:
+            try:
+                return pd.ExcelFile(file_path, engine='calamine')
+            except (ImportError, ValueError) as e:
+                logger.warning(f"⚠️ calamine engine unavailable, using default reader: {e}")
+        if suffix in ('.xlsx', '.xlsm'):
+            return pd.ExcelFile(file_path, engine='openpyxl')
+        if suffix == '.ods':
+            return pd.ExcelFile(file_path, engine='odf')
+        return pd.ExcelFile(file_path)
+    
+    def _open_source_for_update(self, file_path):
+        """
+        Open a generated workbook for in-place edits that keep its formatting
+        External-link parts are skipped - loading them dominates open time and we never re-save them
+        """
+        return load_workbook(file_path, **XLSX_UPDATE_KWARGS)
+    
+    def _plain_excel_writer(self, output_path) -> pd.ExcelWriter:
+        """
+        pandas ExcelWriter for value-only workbooks (styling, if any, is applied afterwards with openpyxl)
+        Uses xlsxwriter when installed, otherwise openpyxl
+        """
+        if XLSXWRITER_AVAILABLE:
+            return pd.ExcelWriter(output_path, engine='xlsxwriter', engine_kwargs=XLSXWRITER_ENGINE_KWARGS)
+        return pd.ExcelWriter(output_path, engine='openpyxl')
+    
+    def _iter_sheet_rows(self, df: pd.DataFrame):
+        """Rows of a frame as tuples of plain Python values, converted column by column"""
+        # Nullable/categorical columns yield pd.NA and float/object columns NaN, which the writers
+        # cannot store - send None instead
+        # datetime64/timedelta64 columns are converted to Python objects once per column rather than per cell
+        columns = []
+        for _, values in df.items():
+            if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+                values = values.astype(object).where(values.notna(), None)
+            elif values.dtype.kind == "M":
+                values = pd.Series(values.dt.to_pydatetime(), index=values.index, dtype=object).where(values.notna(), None)
+            elif values.dtype.kind == "m":
+                values = pd.Series(values.dt.to_pytimedelta(), index=values.index, dtype=object).where(values.notna(), None)
+            elif values.dtype.kind in "fO" and values.hasnans:
+                values = values.astype(object).where(values.notna(), None)
+            columns.append(values)
+        return zip(*columns)
+    
+    def _sheet_header(self, columns: pd.Index) -> List[Any]:
+        """Header cell values; MultiIndex column tuples are joined into one label"""
+        if isinstance(columns, pd.MultiIndex):
+            return [" ".join(str(part) for part in column if not pd.isna(part) and str(part) != "") for column in columns]
+        return [column if isinstance(column, str) else str(column) for column in columns]
+    
+    def _write_sheets_fast(self, output_path, sheets: List[Dict]):
+        """
+        Stream value-only sheets row by row (bounded memory), skipping pandas' per-cell ExcelFormatter
+        Uses xlsxwriter in constant_memory mode when installed, otherwise an openpyxl write_only workbook
+        """
+        if XLSXWRITER_AVAILABLE:
+            wb = xlsxwriter.Workbook(str(output_path), XLSXWRITER_STREAM_OPTIONS)
+            header_format = wb.add_format({"bold": True})
+            for sheet_data in sheets:
+                df = sheet_data["df"]
+                ws = wb.add_worksheet(sheet_data["sheet_name"])
+                ws.write_row(0, 0, self._sheet_header(df.columns), header_format)
+                for row_idx, row in enumerate(self._iter_sheet_rows(df), start=1):
+                    ws.write_row(row_idx, 0, row)
+                logger.info(f"📄 Added sheet '{sheet_data['sheet_name']}' from {sheet_data['source']} ({len(df)} rows, streamed)")
+            wb.close()
+            return
+        
+        wb = Workbook(write_only=True)
+        header_font = Font(bold=True)
+        for sheet_data in sheets:
+            df = sheet_data["df"]
+            ws = wb.create_sheet(title=sheet_data["sheet_name"])
+            
+            header = []
+            for column in self._sheet_header(df.columns):
+                cell = WriteOnlyCell(ws, value=column)
+                cell.font = header_font
+                header.append(cell)
+            ws.append(header)
+            
+            for row in self._iter_sheet_rows(df):
+                ws.append(row)
+            
+            logger.info(f"📄 Added sheet '{sheet_data['sheet_name']}' from {sheet_data['source']} ({len(df)} rows, streamed)")
+        wb.save(output_path)
+    
+    def _detect_header_row(self, xl_file: pd.ExcelFile, sheet_name: str) -> int:
+        """
+        Detect the correct header row in an Excel sheet
+        Reuses the already-open ExcelFile so the workbook is only parsed once
         Returns the row index (0-based) where the actual headers are
         """
         try:
             # Read first 20 rows without header to analyze
-            df_preview = pd.read_excel(file_path, header=None, nrows=20)
+            df_preview = pd.read_excel(xl_file, sheet_name=sheet_name, header=None, nrows=20)
             
-            # Check each row to find the one with the most non-null, non-numeric values
-            best_header_row = 0
-            best_score = 0
+            if len(df_preview) == 0:
+                return 0
             
-            for idx in range(min(10, len(df_preview))):
-                row = df_preview.iloc[idx]
-                
-                # Count non-null values
-                non_null_count = row.notna().sum()
-                
-                # Count string values (likely column names)
-                string_count = sum(1 for val in row if isinstance(val, str) and val.strip())
-                
-                # Score: prefer rows with many non-null string values
-                score = string_count * 2 + non_null_count
-                
-                if score > best_score:
-                    best_score = score
-                    best_header_row = idx
+            # Score the first 10 rows in one pass: prefer rows with many non-null string values
+            preview = df_preview.head(10).to_numpy(dtype=object)
+            string_counts = _is_text_cell(preview).astype(bool).sum(axis=1)
+            non_null_counts = pd.notna(preview).sum(axis=1)
+            scores = string_counts * 2 + non_null_counts
+            
+            best_header_row = int(scores.argmax())
+            best_score = int(scores[best_header_row])
             
             # If we found a row with mostly strings in the first 10 rows, use it
             if best_score > 0 and best_header_row > 0:
@@ -162,7 +715,16 @@ class FullDataAgent:
             Dict with success status and file information
         """
         try:
-            file_path = Path(file_path)
+            # Resolve once so the size check, hashing and parsing all see the same file
+            file_path = Path(file_path).resolve()
+            
+            # 1. File size validation - single stat, before any session state or parsing
+            file_size = file_path.stat().st_size
+            if file_size > self.MAX_FILE_SIZE:
+                return {
+                    "success": False,
+                    "error": f"File too large: {file_size/1024/1024:.1f}MB > {self.MAX_FILE_SIZE/1024/1024}MB limit"
+                }
             
             # Generate file_id if not provided
             if file_id is None:
@@ -175,20 +737,16 @@ class FullDataAgent:
                     "conversation_history": [],
                     "active_file": None,
                     "combined_df": None,
+                    "_combined_dirty": False,
                     "last_generated_file": None,  # Track last generated Excel file
                     "generated_files_history": []  # Track all generated files
                 }
             
-            # 1. File size validation
-            file_size = file_path.stat().st_size
-            if file_size > self.MAX_FILE_SIZE:
-                return {
-                    "success": False,
-                    "error": f"File too large: {file_size/1024/1024:.1f}MB > {self.MAX_FILE_SIZE/1024/1024}MB limit"
-                }
-            
             logger.info(f"📁 Loading Excel file: {file_path.name} ({file_size/1024/1024:.1f}MB) as {file_id}")
             
+            # Content hash - re-uploads of the same file reuse the cached dtypes/profile
+            content_hash = self._file_content_hash(file_path)
+            
             # 2. Load entire DataFrame (with multi-sheet support for Excel)
             if file_path.suffix.lower() == '.csv':
                 df = pd.read_csv(file_path)
@@ -196,88 +754,114 @@ class FullDataAgent:
                 
             elif file_path.suffix.lower() in ['.xlsx', '.xls']:
                 # Check for multiple sheets
-                xl_file = pd.ExcelFile(file_path)
-                sheet_names = xl_file.sheet_names
-                
-                if len(sheet_names) > 1:
-                    # Multi-sheet Excel file - load each sheet as a separate "file"
-                    logger.info(f"📊 Detected multi-sheet Excel with {len(sheet_names)} sheets: {sheet_names}")
+                with self._open_excel_file(file_path) as xl_file:
+                    sheet_names = xl_file.sheet_names
                     
-                    loaded_sheets = []
-                    for idx, sheet_name in enumerate(sheet_names):
-                        df_sheet = pd.read_excel(xl_file, sheet_name=sheet_name)
+                    if len(sheet_names) > 1:
+                        # Multi-sheet Excel file - load each sheet as a separate "file"
+                        logger.info(f"📊 Detected multi-sheet Excel with {len(sheet_names)} sheets: {sheet_names}")
                         
-                        # Log sheet info
-                        if len(df_sheet) == 0:
-                            logger.warning(f"⚠️ Sheet '{sheet_name}' is empty, skipping optimization")
-                        else:
-                            logger.info(f"✅ Loaded sheet '{sheet_name}': {len(df_sheet)} rows × {len(df_sheet.columns)} columns")
+                        def _read_one_sheet(sheet_name):
+                            header_row = self._detect_header_row(xl_file, sheet_name)
+                            df_sheet = pd.read_excel(xl_file, sheet_name=sheet_name, header=header_row)
+                            
+                            # Log sheet info
+                            if len(df_sheet) == 0:
+                                logger.warning(f"⚠️ Sheet '{sheet_name}' is empty, skipping optimization")
+                            else:
+                                logger.info(f"✅ Loaded sheet '{sheet_name}': {len(df_sheet)} rows × {len(df_sheet.columns)} columns")
+                            return df_sheet
                         
-                        # Create unique file_id for each sheet
-                        sheet_file_id = f"{file_id}_sheet_{idx}_{sheet_name.replace(' ', '_')}"
+                        # Parse serially: the shared ExcelFile handle (openpyxl read-only / calamine) is not
+                        # thread-safe; optimizing and profiling below is what runs on the sheet pool
+                        raw_sheets = [_read_one_sheet(sheet_name) for sheet_name in sheet_names]
                         
-                        # Optimize data types
-                        df_sheet_optimized = self._optimize_dtypes(df_sheet)
-                        memory_saved_sheet = df_sheet.memory_usage(deep=True).sum() - df_sheet_optimized.memory_usage(deep=True).sum()
+                        # Same-schema sheets (e.g. monthly tabs) share one grouped stats pass
+                        batched_stats = self._batch_column_stats(raw_sheets)
                         
-                        # Create data profile
-                        data_profile_sheet = self._create_comprehensive_profile(df_sheet_optimized)
+                        def _load_one_sheet(idx, sheet_name):
+                            df_sheet = raw_sheets[idx]
+                            raw_sheets[idx] = None  # Only this sheet's task holds the raw frame now
+                            
+                            # Optimize data types and create data profile (reused for identical content)
+                            memory_before_sheet = self._estimate_memory_bytes(df_sheet)
+                            df_sheet_optimized, data_profile_sheet = self._optimize_and_profile(
+                                df_sheet,
+                                cache_key=(content_hash, sheet_name),
+                                column_stats=batched_stats[idx] if batched_stats else None
+                            )
+                            del df_sheet
+                            memory_after_sheet = self._estimate_memory_bytes(df_sheet_optimized)
+                            memory_saved_sheet = memory_before_sheet - memory_after_sheet
+                            
+                            return idx, sheet_name, df_sheet_optimized, memory_after_sheet, memory_saved_sheet, data_profile_sheet
                         
-                        # Store sheet data
-                        self.session_data[session_id]["files"][sheet_file_id] = {
-                            "df": df_sheet_optimized,
-                            "profile": data_profile_sheet,
-                            "filename": f"{file_path.stem}_{sheet_name}",
-                            "sheet_name": sheet_name,
-                            "sheet_index": idx,
-                            "original_file": file_path.name,
-                            "original_file_path": str(file_path),
-                            "is_sheet": True,
-                            "file_size_mb": file_size / 1024 / 1024,
-                            "memory_usage_mb": df_sheet_optimized.memory_usage(deep=True).sum() / 1024 / 1024,
-                            "memory_saved_mb": memory_saved_sheet / 1024 / 1024
-                        }
+                        # Sheets are independent - optimize and profile them concurrently
+                        sheet_results = self._run_per_sheet(_load_one_sheet, list(enumerate(sheet_names)))
                         
-                        loaded_sheets.append({
-                            "sheet_name": sheet_name,
-                            "file_id": sheet_file_id,
-                            "rows": len(df_sheet_optimized),
-                            "columns": len(df_sheet_optimized.columns)
-                        })
+                        loaded_sheets = []
+                        for idx, sheet_name, df_sheet_optimized, memory_after_sheet, memory_saved_sheet, data_profile_sheet in sheet_results:
+                            # Create unique file_id for each sheet
+                            sheet_file_id = f"{file_id}_sheet_{idx}_{sheet_name.replace(' ', '_')}"
+                            
+                            # Store sheet data
+                            self.session_data[session_id]["files"][sheet_file_id] = {
+                                "df": df_sheet_optimized,
+                                "profile": data_profile_sheet,
+                                "filename": f"{file_path.stem}_{sheet_name}",
+                                "sheet_name": sheet_name,
+                                "sheet_index": idx,
+                                "original_file": file_path.name,
+                                "original_file_path": str(file_path),
+                                "is_sheet": True,
+                                "file_size_mb": file_size / 1024 / 1024,
+                                "memory_usage_mb": memory_after_sheet / 1024 / 1024,
+                                "memory_saved_mb": memory_saved_sheet / 1024 / 1024
+                            }
+                            
+                            loaded_sheets.append({
+                                "sheet_name": sheet_name,
+                                "file_id": sheet_file_id,
+                                "rows": len(df_sheet_optimized),
+                                "columns": len(df_sheet_optimized.columns)
+                            })
+                            
+                            logger.info(f"✅ Loaded sheet '{sheet_name}': {len(df_sheet_optimized)} rows × {len(df_sheet_optimized.columns)} columns")
+                        
+                        # Set first sheet as active
+                        if self.session_data[session_id]["active_file"] is None:
+                            self.session_data[session_id]["active_file"] = loaded_sheets[0]["file_id"]
+                        
+                        # Update combined DataFrame
+                        self._update_combined_dataframe(session_id)
+                        
+                        return {
+                            "success": True,
+                            "file_id": file_id,
+                            "is_multi_sheet": True,
+                            "sheets": loaded_sheets,
+                            "total_rows": sum(s["rows"] for s in loaded_sheets),
+                            "message": f"Loaded {len(sheet_names)} sheets from {file_path.name}"
+                        }
+                    else:
+                        # Single sheet Excel file - detect header row
+                        header_row = self._detect_header_row(xl_file, sheet_names[0])
+                        df = pd.read_excel(xl_file, sheet_name=sheet_names[0], header=header_row)
+                        logger.info(f"📊 Loaded single-sheet Excel: {len(df)} rows × {len(df.columns)} columns (header at row {header_row})")
                         
-                        logger.info(f"✅ Loaded sheet '{sheet_name}': {len(df_sheet_optimized)} rows × {len(df_sheet_optimized.columns)} columns")
-                    
-                    # Set first sheet as active
-                    if self.session_data[session_id]["active_file"] is None:
-                        self.session_data[session_id]["active_file"] = loaded_sheets[0]["file_id"]
-                    
-                    # Update combined DataFrame
-                    self._update_combined_dataframe(session_id)
-                    
-                    return {
-                        "success": True,
-                        "file_id": file_id,
-                        "is_multi_sheet": True,
-                        "sheets": loaded_sheets,
-                        "total_rows": sum(s["rows"] for s in loaded_sheets),
-                        "message": f"Loaded {len(sheet_names)} sheets from {file_path.name}"
-                    }
-                else:
-                    # Single sheet Excel file - detect header row
-                    header_row = self._detect_header_row(file_path)
-                    df = pd.read_excel(xl_file, sheet_name=sheet_names[0], header=header_row)
-                    logger.info(f"📊 Loaded single-sheet Excel: {len(df)} rows × {len(df.columns)} columns (header at row {header_row})")
-                    
             elif file_path.suffix.lower() == '.ods':
-                df = pd.read_excel(file_path, engine='odf')
+                with self._open_excel_file(file_path) as ods_file:
+                    df = pd.read_excel(ods_file)
                 logger.info(f"📊 Loaded ODS: {len(df)} rows × {len(df.columns)} columns")
                 
             elif file_path.suffix.lower() == '.gsheet':
-                # Try CSV first, then Excel
-                try:
-                    df = pd.read_csv(file_path)
-                except:
+                # Sniff the content: xlsx exports are ZIP archives, anything else is CSV
+                with open(file_path, 'rb') as fh:
+                    magic = fh.read(4)
+                if magic == ZIP_MAGIC:
                     df = pd.read_excel(file_path)
+                else:
+                    df = pd.read_csv(file_path)
                 logger.info(f"📊 Loaded Google Sheet: {len(df)} rows × {len(df.columns)} columns")
             else:
                 return {"success": False, "error": f"Unsupported file type: {file_path.suffix}"}
@@ -287,13 +871,13 @@ class FullDataAgent:
                 logger.warning(f"⚠️ Large dataset: {len(df)} rows > {self.MAX_ROWS_THRESHOLD} threshold")
             
             # 3. Optimize data types to reduce memory usage
-            df_optimized = self._optimize_dtypes(df)
-            memory_saved = df.memory_usage(deep=True).sum() - df_optimized.memory_usage(deep=True).sum()
+            # 4. Create comprehensive data profile (both reused for identical content)
+            memory_before = self._estimate_memory_bytes(df)
+            df_optimized, data_profile = self._optimize_and_profile(df, cache_key=(content_hash, None))
+            memory_after = self._estimate_memory_bytes(df_optimized)
+            memory_saved = memory_before - memory_after
             logger.info(f"💾 Memory optimization: Saved {memory_saved/1024/1024:.1f}MB")
             
-            # 4. Create comprehensive data profile
-            data_profile = self._create_comprehensive_profile(df_optimized)
-            
             # 5. Store file data in session
             self.session_data[session_id]["files"][file_id] = {
                 "df": df_optimized,
@@ -301,7 +885,7 @@ class FullDataAgent:
                 "filename": file_path.name,
                 "file_path": str(file_path),  # Store source file path for format preservation
                 "file_size_mb": file_size / 1024 / 1024,
-                "memory_usage_mb": df_optimized.memory_usage(deep=True).sum() / 1024 / 1024,
+                "memory_usage_mb": memory_after / 1024 / 1024,
                 "memory_saved_mb": memory_saved / 1024 / 1024
             }
             
@@ -321,7 +905,7 @@ class FullDataAgent:
                 "filename": file_path.name,
                 "rows": len(df_optimized),
                 "columns": len(df_optimized.columns),
-                "memory_usage_mb": df_optimized.memory_usage(deep=True).sum() / 1024 / 1024,
+                "memory_usage_mb": memory_after / 1024 / 1024,
                 "file_size_mb": file_size / 1024 / 1024,
                 "memory_saved_mb": memory_saved / 1024 / 1024,
                 "total_files": len(self.session_data[session_id]["files"]),
@@ -371,6 +955,7 @@ class FullDataAgent:
                     "conversation_history": [],
                     "active_file": None,
                     "combined_df": None,
+                    "_combined_dirty": False,
                     "last_generated_file": None,
                     "generated_files_history": []
                 }
@@ -384,23 +969,21 @@ class FullDataAgent:
                     # Multi-sheet Google Sheet - load each sheet as a separate "file"
                     logger.info(f"📊 Detected multi-sheet Google Sheet with {len(all_sheets)} sheets: {list(all_sheets.keys())}")
                     
-                    loaded_sheets = []
-                    for idx, (sheet_name, df_sheet) in enumerate(all_sheets.items()):
+                    for sheet_name, df_sheet in all_sheets.items():
                         # Log sheet info
                         if len(df_sheet) == 0:
                             logger.warning(f"⚠️ Sheet '{sheet_name}' is empty, skipping optimization")
                         else:
                             logger.info(f"✅ Loaded sheet '{sheet_name}': {len(df_sheet)} rows × {len(df_sheet.columns)} columns")
-                        
+                    
+                    # Optimize data types and create data profiles concurrently
+                    sheet_results = self._run_per_sheet(self._prepare_sheet, list(all_sheets.items()))
+                    
+                    loaded_sheets = []
+                    for idx, (sheet_name, df_sheet_optimized, data_profile_sheet) in enumerate(sheet_results):
                         # Create unique file_id for each sheet
                         sheet_file_id = f"{file_id}_sheet_{idx}_{sheet_name.replace(' ', '_')}"
                         
-                        # Optimize data types
-                        df_sheet_optimized = self._optimize_dtypes(df_sheet)
-                        
-                        # Create data profile
-                        data_profile_sheet = self._create_comprehensive_profile(df_sheet_optimized)
-                        
                         # Store sheet data
                         self.session_data[session_id]["files"][sheet_file_id] = {
                             "df": df_sheet_optimized,
@@ -450,11 +1033,9 @@ class FullDataAgent:
                     sheet_name=sheet_name
                 )
             
-            # Optimize data types
-            df_optimized = self._optimize_dtypes(df)
-            
-            # Create data profile
-            data_profile = self._create_comprehensive_profile(df_optimized)
+            # Optimize data types and create data profile (reused for identical content)
+            _, df_optimized, data_profile = self._prepare_sheet(sheet_name, df)
+            memory_after = df_optimized.memory_usage(deep=True).sum()
             
             # Store in session
             self.session_data[session_id]["files"][file_id] = {
@@ -464,7 +1045,7 @@ class FullDataAgent:
                 "source_type": "google_sheets",
                 "spreadsheet_url": spreadsheet_url,
                 "sheet_name": sheet_name,
-                "memory_usage_mb": df_optimized.memory_usage(deep=True).sum() / 1024 / 1024
+                "memory_usage_mb": memory_after / 1024 / 1024
             }
             
             # Set as active file if first one
@@ -483,7 +1064,7 @@ class FullDataAgent:
                 "filename": f"GoogleSheet_{sheet_name or 'Sheet1'}",
                 "rows": int(len(df_optimized)),           # Convert to Python int
                 "columns": int(len(df_optimized.columns)), # Convert to Python int
-                "memory_usage_mb": float(df_optimized.memory_usage(deep=True).sum() / 1024 / 1024),
+                "memory_usage_mb": float(memory_after / 1024 / 1024),
                 "total_files": len(self.session_data[session_id]["files"]),
                 "profile": data_profile
             }
@@ -532,6 +1113,7 @@ class FullDataAgent:
                     "conversation_history": [],
                     "active_file": None,
                     "combined_df": None,
+                    "_combined_dirty": False,
                     "last_generated_file": None,
                     "generated_files_history": []
                 }
@@ -539,16 +1121,13 @@ class FullDataAgent:
             loaded_sheets = []
             total_rows = 0
             
+            # Optimize data types and create data profiles concurrently
+            sheet_results = self._run_per_sheet(self._prepare_sheet, list(all_sheets.items()))
+            
             # Load each sheet as a separate file
-            for sheet_name, df in all_sheets.items():
+            for sheet_name, df_optimized, data_profile in sheet_results:
                 file_id = f"gsheet_{session_id}_{sheet_name.replace(' ', '_')}"
                 
-                # Optimize data types
-                df_optimized = self._optimize_dtypes(df)
-                
-                # Create data profile
-                data_profile = self._create_comprehensive_profile(df_optimized)
-                
                 # Store in session
                 self.session_data[session_id]["files"][file_id] = {
                     "df": df_optimized,
@@ -593,6 +1172,177 @@ class FullDataAgent:
             logger.error(f"❌ Error loading all sheets from Google Spreadsheet: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
     
+    def _estimate_memory_bytes(self, df: pd.DataFrame) -> int:
+        """
+        Cheap estimate of deep memory usage
+        Shallow column sizes plus string payloads via a vectorized str.len() pass,
+        instead of memory_usage(deep=True) walking every object cell; categorical columns
+        add the payload of their (distinct) categories, so before/after optimization compare
+        """
+        total = df.memory_usage(deep=False).sum()
+        for col in df.columns[(df.dtypes == object) | (df.dtypes == 'category')]:
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.cat.categories.to_series()
+                if values.dtype != object:
+                    continue
+            try:
+                lengths = values.str.len()
+            except AttributeError:
+                # No string values in this column
+                continue
+            total += lengths.sum() + lengths.count() * STR_OBJECT_OVERHEAD_BYTES
+        return int(total)
+    
+    def _approx_memory_bytes(self, df: pd.DataFrame) -> int:
+        """
+        O(columns) memory estimate for display purposes
+        Exact buffer sizes from the shallow scan plus a flat per-cell cost for Python objects
+        """
+        total = df.memory_usage(deep=False).sum()
+        python_object_cols = sum(
+            1 for dtype in df.dtypes
+            if dtype == object or getattr(dtype, "storage", None) == "python"
+        )
+        return int(total + python_object_cols * len(df) * OBJECT_CELL_ESTIMATE_BYTES)
+    
+    def _prepare_sheet(self, sheet_name: str, df: pd.DataFrame):
+        """Optimize data types and build the profile for one already-loaded sheet"""
+        df_optimized, profile = self._optimize_and_profile(df, cache_key=self._frame_fingerprint(df))
+        return sheet_name, df_optimized, profile
+    
+    def _file_content_hash(self, file_path: Path) -> str:
+        """Hash the raw bytes of an uploaded file"""
+        hasher = new_hasher()
+        with open(file_path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(HASH_CHUNK_BYTES), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+    
+    def _frame_fingerprint(self, df: pd.DataFrame) -> Optional[str]:
+        """Hash the column names and cell values of a DataFrame (for sources without a file)"""
+        hasher = new_hasher()
+        hasher.update(repr(list(df.columns)).encode("utf-8"))
+        try:
+            hasher.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        except TypeError:
+            # Unhashable cell values - skip caching for this frame
+            return None
+        return hasher.hexdigest()
+    
+    def _optimize_and_profile(self, df: pd.DataFrame, cache_key=None, column_stats: Optional[Dict[str, Any]] = None):
+        """
+        Optimize data types and build the profile, reusing the cached result for identical content
+        On a hit the cached dtype map is applied directly, skipping both passes
+        """
+        if cache_key is not None:
+            with self._profile_cache_lock:
+                cached = self._profile_cache.get(cache_key)
+                if cached is not None:
+                    self._profile_cache.move_to_end(cache_key)
+            if cached is not None:
+                dtype_map, profile = cached
+                logger.info(f"⚡ Reusing cached profile for identical content ({len(df)} rows)")
+                for col, dtype in dtype_map.items():
+                    if df[col].dtype != dtype:
+                        df[col] = df[col].astype(dtype)
+                return df, profile
+        
+        df_optimized = self._optimize_dtypes(df, inplace=True)
+        profile = self._create_comprehensive_profile(df_optimized, column_stats=column_stats)
+        
+        if cache_key is not None:
+            with self._profile_cache_lock:
+                self._profile_cache[cache_key] = (df_optimized.dtypes.to_dict(), profile)
+                if len(self._profile_cache) > PROFILE_CACHE_SIZE:
+                    self._profile_cache.popitem(last=False)
+        return df_optimized, profile
+    
+    def _batch_column_stats(self, frames: List[pd.DataFrame]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Null/distinct counts and numeric summary stats for same-schema sheets in one grouped pass
+        Returns None when schemas differ, a sheet is empty or the sheets are too large to copy
+        into one frame (BATCH_STATS_MAX_CELLS), so each sheet is profiled on its own
+        """
+        if len(frames) < 2 or any(len(frame) == 0 for frame in frames):
+            return None
+        if sum(frame.size for frame in frames) > BATCH_STATS_MAX_CELLS:
+            return None
+        
+        first = frames[0]
+        if first.columns.has_duplicates:
+            return None
+        for frame in frames[1:]:
+            if not frame.columns.equals(first.columns) or not frame.dtypes.equals(first.dtypes):
+                return None
+        
+        try:
+            combined = pd.concat(frames, keys=range(len(frames)), names=["_sheet", None], sort=False)
+            by_sheet = combined.groupby(level="_sheet", sort=False)
+            
+            missing = combined.isnull().groupby(level="_sheet", sort=False).sum()
+            nunique = by_sheet.nunique()
+            numerical_cols = list(first.select_dtypes(include=['number']).columns)
+            numeric = by_sheet[numerical_cols].agg(list(NUMERIC_PROFILE_STATS)) if numerical_cols else None
+        except Exception as e:
+            logger.warning(f"⚠️ Batched sheet stats failed, profiling sheets individually: {e}")
+            return None
+        
+        logger.info(f"📐 Computed column stats for {len(frames)} same-schema sheets in one pass")
+        return [
+            {
+                "missing": missing.loc[idx],
+                "nunique": nunique.loc[idx],
+                "numeric": numeric.loc[idx] if numeric is not None else None
+            }
+            for idx in range(len(frames))
+        ]
+    
+    def _polars_column_stats(self, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """
+        Null/distinct counts and numeric summary stats computed multi-threaded in Polars
+        Same shape as _batch_column_stats entries; None if the frame can't be converted
+        """
+        columns = list(df.columns)
+        if df.columns.has_duplicates or not all(isinstance(col, str) for col in columns):
+            return None
+        
+        try:
+            pl_df = pl.from_pandas(df)
+            null_counts = pl_df.null_count().row(0)
+            # pandas' nunique ignores nulls; Polars counts null as a value
+            unique_counts = pl_df.select(
+                [pl.col(col).drop_nulls().n_unique().alias(str(idx)) for idx, col in enumerate(columns)]
+            ).row(0)
+            
+            numerical_cols = list(df.select_dtypes(include=['number']).columns)
+            stat_keys = [(col, stat) for col in numerical_cols for stat in NUMERIC_PROFILE_STATS]
+            numeric = None
+            if stat_keys:
+                numeric_row = pl_df.select(
+                    [getattr(pl.col(col), stat)().alias(str(idx)) for idx, (col, stat) in enumerate(stat_keys)]
+                ).row(0)
+                numeric = pd.Series(numeric_row, index=pd.MultiIndex.from_tuples(stat_keys))
+        except Exception as e:
+            logger.warning(f"⚠️ Polars stats failed, using pandas: {e}")
+            return None
+        
+        return {
+            "missing": pd.Series(null_counts, index=df.columns),
+            "nunique": pd.Series(unique_counts, index=df.columns),
+            "numeric": numeric
+        }
+    
+    def _run_per_sheet(self, func, items: List[tuple]) -> List[Any]:
+        """
+        Run func(*item) for every item on the shared sheet pool, preserving input order
+        Sheets are independent, and the pandas/NumPy work releases the GIL
+        """
+        if len(items) <= 1:
+            return [func(*item) for item in items]
+        
+        return list(self._sheet_executor.map(lambda item: func(*item), items))
+    
     def get_session_files(self, session_id: str) -> Dict[str, Dict]:
         """Get all files for a session"""
         if session_id not in self.session_data:
@@ -600,33 +1350,109 @@ class FullDataAgent:
         return self.session_data[session_id]["files"]
     
     def _update_combined_dataframe(self, session_id: str):
-        """Update combined DataFrame when multiple files are loaded"""
+        """Mark the combined DataFrame stale - it is rebuilt lazily by _get_combined_df"""
         if session_id not in self.session_data:
             return
         
+        self.session_data[session_id]["combined_df"] = None
+        self.session_data[session_id]["_combined_dirty"] = True
+        self.session_data[session_id]["_revision"] = self.session_data[session_id].get("_revision", 0) + 1
+        # Drop cached context that still references the old combined frame
+        self.session_data[session_id].pop("_frame_context", None)
+        self.session_data[session_id].pop("_data_context_cache", None)
+        self._refresh_google_sheets_source(session_id)
+    
+    def _refresh_google_sheets_source(self, session_id: str):
+        """Record whether the session's files come from a Google Sheet, so operations skip the per-file scan"""
+        session = self.session_data[session_id]
+        google_file = next(
+            (file_info for file_info in session.get("files", {}).values()
+             if file_info.get("source_type") == "google_sheets"),
+            None
+        )
+        session["has_google_sheets"] = google_file is not None
+        session["google_sheets_url"] = google_file.get("spreadsheet_url") if google_file else None
+    
+    def _get_combined_df(self, session_id: str) -> Optional[pd.DataFrame]:
+        """Get the combined DataFrame, rebuilding it once if files changed since the last build"""
+        if session_id not in self.session_data:
+            return None
+        
+        session = self.session_data[session_id]
+        if session.get("_combined_dirty", False):
+            self._build_combined_dataframe(session_id)
+            session["_combined_dirty"] = False
+        return session["combined_df"]
+    
+    def _build_combined_dataframe(self, session_id: str):
+        """Build combined DataFrame when multiple files are loaded"""
         files = self.session_data[session_id]["files"]
         if len(files) <= 1:
             # Single file or no files - no need for combined DataFrame
             self.session_data[session_id]["combined_df"] = None
             return
         
-        # Combine all DataFrames
-        dataframes = []
-        for file_id, file_data in files.items():
-            df = file_data["df"].copy()
-            df["_source_file"] = file_data["filename"]  # Add source file column
-            df["_file_id"] = file_id  # Add file ID column
-            dataframes.append(df)
+        # Combine all DataFrames - no per-file copies, bookkeeping comes from concat keys
+        file_ids = list(files.keys())
+        dataframes = [files[file_id]["df"] for file_id in file_ids]
+        id_to_name = {file_id: files[file_id]["filename"] for file_id in file_ids}
         
         try:
             # Attempt to concatenate - this works if columns are similar
-            combined_df = pd.concat(dataframes, ignore_index=True, sort=False)
+            combined_df = self._concat_same_schema(dataframes)
+            if combined_df is not None:
+                file_id_level = pd.Index(file_ids)
+                file_id_codes = np.repeat(
+                    np.arange(len(file_ids), dtype=np.int32),
+                    [len(df) for df in dataframes]
+                )
+            else:
+                combined_df = pd.concat(dataframes, keys=file_ids, names=["_file_id", None], sort=False)
+                
+                # The concat keys level already holds one integer code per row - reuse it
+                # for categorical bookkeeping columns instead of broadcasting strings
+                file_id_level = combined_df.index.levels[0]
+                file_id_codes = combined_df.index.codes[0]
+                combined_df.index = pd.RangeIndex(len(combined_df))
+            
+            level_names = [id_to_name[file_id] for file_id in file_id_level]
+            source_names = list(dict.fromkeys(level_names))  # Filenames may repeat across file ids
+            name_codes = np.array([source_names.index(name) for name in level_names], dtype=file_id_codes.dtype)
+            
+            combined_df["_source_file"] = pd.Categorical.from_codes(name_codes[file_id_codes], categories=source_names)  # Add source file column
+            combined_df["_file_id"] = pd.Categorical.from_codes(file_id_codes, categories=file_id_level)  # Add file ID column
             self.session_data[session_id]["combined_df"] = combined_df
             logger.info(f"📊 Combined {len(files)} files into single DataFrame: {len(combined_df)} rows")
         except Exception as e:
             logger.warning(f"⚠️ Could not combine files - different structures: {e}")
             self.session_data[session_id]["combined_df"] = None
     
+    def _concat_same_schema(self, frames: List[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """
+        Concatenate frames with identical columns and dtypes column by column
+        NumPy-backed columns are copied once into a preallocated array (no block-manager
+        coalescing); returns None for differing schemas so callers fall back to pd.concat
+        """
+        first = frames[0]
+        if first.columns.has_duplicates:
+            return None
+        for frame in frames[1:]:
+            if not frame.columns.equals(first.columns) or not frame.dtypes.equals(first.dtypes):
+                return None
+        
+        total_rows = sum(len(frame) for frame in frames)
+        columns = {}
+        for col, dtype in first.dtypes.items():
+            if isinstance(dtype, np.dtype):
+                out = np.empty(total_rows, dtype=dtype)
+                np.concatenate([frame[col].to_numpy() for frame in frames], out=out)
+                columns[col] = out
+            else:
+                # Extension dtypes (category, string, tz-aware) keep pandas' own concat
+                columns[col] = pd.concat([frame[col] for frame in frames], ignore_index=True)
+        
+        return pd.DataFrame(columns, columns=first.columns, copy=False)
+    
     def set_active_file(self, session_id: str, file_id: str) -> bool:
         """Set the active file for analysis"""
         if session_id not in self.session_data:
@@ -671,8 +1497,9 @@ class FullDataAgent:
             return files[file_id]["df"]
         else:
             # Multiple files - return combined if available, otherwise active file
-            if session["combined_df"] is not None:
-                return session["combined_df"]
+            combined_df = self._get_combined_df(session_id)
+            if combined_df is not None:
+                return combined_df
             elif session["active_file"] and session["active_file"] in files:
                 return files[session["active_file"]]["df"]
             else:
@@ -682,8 +1509,12 @@ class FullDataAgent:
     
     def _build_multi_file_context(self, session_id: str, df: pd.DataFrame, user_query: str) -> str:
         """Build context for LLM with multi-file awareness and conversation history"""
+        context_parts = [self._build_history_context(session_id), self._build_data_context(session_id, df)]
+        return "\n".join(part for part in context_parts if part)
+    
+    def _build_history_context(self, session_id: str) -> str:
+        """Build the conversation-history part of the LLM context (changes on every query)"""
         session = self.session_data[session_id]
-        files = session["files"]
         history = session.get("conversation_history", [])
         
         context_parts = []
@@ -693,40 +1524,103 @@ class FullDataAgent:
             context_parts.append("=== CONVERSATION HISTORY ===")
             context_parts.append("Previous questions and answers in this session:")
             
-            # Include last 5 conversations for context (to avoid token limits)
-            recent_history = history[-5:] if len(history) > 5 else history
-            for idx, conv in enumerate(recent_history, 1):
-                user_q = conv.get("user_query", "")
-                # Get the execution output or result
-                exec_result = conv.get("execution_result", {})
-                output = exec_result.get("execution_output", "") if isinstance(exec_result, dict) else str(exec_result)
-                
-                context_parts.append(f"\n{idx}. User asked: \"{user_q}\"")
-                if output:
-                    # Truncate long outputs
-                    output_preview = output[:200] + "..." if len(output) > 200 else output
-                    context_parts.append(f"   Answer: {output_preview}")
+            # Include as many recent conversations as fit the token budget
+            for idx, turn in enumerate(self._truncate_history(history, HISTORY_TOKEN_BUDGET), 1):
+                context_parts.append(f"\n{idx}. {turn}")
             
             context_parts.append("\n⚠️ IMPORTANT: Use this conversation history to understand context. If the user refers to something mentioned before (like a BUD ID, name, or value), use that information from the history above.")
             context_parts.append("")
         
+        return "\n".join(context_parts)
+    
+    def _truncate_history(self, history: List[Dict[str, Any]], max_tokens: int) -> List[str]:
+        """
+        Format the newest conversation turns that fit within max_tokens
+        Walks newest to oldest and returns the kept turns oldest first; the newest turn is always kept
+        """
+        turns = []
+        used_tokens = 0
+        for conv in reversed(history[-HISTORY_MAX_TURNS:]):
+            turn = self._format_history_turn(conv)
+            turn_tokens = _count_tokens(turn)
+            if turns and used_tokens + turn_tokens > max_tokens:
+                break
+            turns.append(turn)
+            used_tokens += turn_tokens
+        turns.reverse()
+        return turns
+    
+    def _format_history_turn(self, conv: Dict[str, Any]) -> str:
+        """Format one conversation turn (question plus a token-bounded answer preview)"""
+        user_q = conv.get("user_query", "")
+        # Get the execution output or result
+        exec_result = conv.get("execution_result", {})
+        output = exec_result.get("execution_output", "") if isinstance(exec_result, dict) else str(exec_result)
+        
+        turn = f"User asked: \"{user_q}\""
+        if output:
+            turn += f"\n   Answer: {self._truncate_to_tokens(output, HISTORY_ANSWER_TOKENS)}"
+        return turn
+    
+    def _truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """
+        Cut text to at most max_tokens, preferring a sentence or line boundary
+        Binary-searches the longest prefix that fits instead of slicing a fixed number of characters
+        """
+        # No token is longer than this many characters in practice, which bounds the search
+        search_limit = min(len(text), max_tokens * CHARS_PER_TOKEN * 4)
+        if search_limit == len(text) and _count_tokens(text) <= max_tokens:
+            return text
+        
+        low, high = 0, search_limit
+        while low < high:
+            mid = (low + high + 1) // 2
+            if _count_tokens(text[:mid]) <= max_tokens:
+                low = mid
+            else:
+                high = mid - 1
+        
+        prefix = text[:low]
+        boundary = max(prefix.rfind(". "), prefix.rfind("\n"))
+        if boundary >= low // 2:
+            prefix = prefix[:boundary + 1]
+        return prefix.rstrip() + "..."
+    
+    def _build_data_context(self, session_id: str, df: pd.DataFrame) -> str:
+        """
+        Build the dataset part of the LLM context (stable until the loaded files change)
+        Cached per session; reused while the session revision, files, active file and df are unchanged
+        """
+        session = self.session_data[session_id]
+        cache_key = (session.get("_revision", 0), session["active_file"], df.shape, tuple(df.columns))
+        cached = session.get("_data_context_cache")
+        if (cached and cached["key"] == cache_key
+                and cached["files"] is session["files"] and cached["df"] is df):
+            return cached["context"]
+        
+        self._get_combined_df(session_id)  # Make sure a stale combined frame is rebuilt first
+        context = self._render_data_context(session, df)
+        session["_data_context_cache"] = {
+            "key": cache_key,
+            "files": session["files"],
+            "df": df,
+            "context": context
+        }
+        return context
+    
+    def _render_data_context(self, session: Dict[str, Any], df: pd.DataFrame) -> str:
+        """Render the dataset part of the LLM context from scratch"""
+        files = session["files"]
+        
+        context_parts = []
+        
         # Multi-file/Multi-sheet information
         if len(files) > 1:
             context_parts.append("=== MULTI-FILE/MULTI-SHEET SESSION ===")
             context_parts.append(f"Total files/sheets loaded: {len(files)}")
             
             for file_id, file_data in files.items():
-                # Check if this is a sheet from a multi-sheet Excel
-                if file_data.get("is_sheet", False):
-                    original_file = file_data.get('original_file', 'merged file')
-                    context_parts.append(f"\nSheet: {file_data['sheet_name']} from {original_file} (ID: {file_id})")
-                    context_parts.append(f"- Sheet Index: {file_data['sheet_index']}")
-                else:
-                    context_parts.append(f"\nFile: {file_data['filename']} (ID: {file_id})")
-                
-                context_parts.append(f"- Rows: {len(file_data['df'])}")
-                context_parts.append(f"- Columns: {len(file_data['df'].columns)}")
-                context_parts.append(f"- Column names: {list(file_data['df'].columns)}")
+                context_parts.append(self._get_file_context_block(file_id, file_data))
                 
             context_parts.append(f"\n⚠️ CRITICAL: When asked about specific sheets or files, use the sheet/file name to identify which data to work with. If user mentions a sheet name (e.g., 'Learners sheet', 'Applicants tab'), work with that specific sheet's data.")
             
@@ -746,6 +1640,56 @@ class FullDataAgent:
             context_parts.append(f"=== SINGLE FILE SESSION ===")
             context_parts.append(f"File: {file_data['filename']}")
         
+        context_parts.append(self._get_frame_context(session, df))
+        
+        return "\n".join(context_parts)
+    
+    def _get_file_context_block(self, file_id: str, file_data: Dict[str, Any]) -> str:
+        """
+        Per-file lines of the multi-file context (name, rows, columns), kept on the file entry
+        Re-rendered only when the file's df or its columns Index object is replaced
+        """
+        df = file_data["df"]
+        cached = file_data.get("_context_block")
+        if cached and cached["df"] is df and cached["columns"] is df.columns and cached["rows"] == len(df):
+            return cached["context"]
+        
+        block_parts = []
+        # Check if this is a sheet from a multi-sheet Excel
+        if file_data.get("is_sheet", False):
+            original_file = file_data.get('original_file', 'merged file')
+            block_parts.append(f"\nSheet: {file_data['sheet_name']} from {original_file} (ID: {file_id})")
+            block_parts.append(f"- Sheet Index: {file_data['sheet_index']}")
+        else:
+            block_parts.append(f"\nFile: {file_data['filename']} (ID: {file_id})")
+        
+        block_parts.append(f"- Rows: {len(df)}")
+        block_parts.append(f"- Columns: {len(df.columns)}")
+        block_parts.append(f"- Column names: {list(df.columns)}")
+        
+        context = "\n".join(block_parts)
+        file_data["_context_block"] = {"df": df, "columns": df.columns, "rows": len(df), "context": context}
+        return context
+    
+    def _get_frame_context(self, session: Dict[str, Any], df: pd.DataFrame) -> str:
+        """
+        CURRENT DATAFRAME section for df, kept on the owning file entry (or the session for the combined frame)
+        Re-rendered only when df is replaced or its shape/columns change
+        """
+        owner = next((file_data for file_data in session["files"].values() if file_data["df"] is df), session)
+        signature = (df.shape, tuple(df.columns))
+        cached = owner.get("_frame_context")
+        if cached and cached["df"] is df and cached["signature"] == signature:
+            return cached["context"]
+        
+        context = self._render_frame_context(session, df)
+        owner["_frame_context"] = {"df": df, "signature": signature, "context": context}
+        return context
+    
+    def _render_frame_context(self, session: Dict[str, Any], df: pd.DataFrame) -> str:
+        """Render shape, dtypes, sample rows and missing values for df"""
+        context_parts = []
+        
         # Current DataFrame information
         context_parts.append(f"\n=== CURRENT DATAFRAME ===")
         context_parts.append(f"Shape: {df.shape[0]} rows × {df.shape[1]} columns")
@@ -761,7 +1705,7 @@ class FullDataAgent:
         context_parts.append(df.head(3).to_string())
         
         # Missing values
-        missing = df.isnull().sum()
+        missing = self._get_null_counts(session, df)
         if missing.sum() > 0:
             context_parts.append(f"\nMissing values:")
             for col, count in missing.items():
@@ -770,63 +1714,154 @@ class FullDataAgent:
         
         return "\n".join(context_parts)
     
-    def clear_session(self, session_id: str):
-        """Clear all data for a session"""
-        if session_id in self.session_data:
-            del self.session_data[session_id]
-            logger.info(f"🗑️ Cleared session data: {session_id}")
+    def _get_null_counts(self, session: Dict[str, Any], df: pd.DataFrame) -> pd.Series:
+        """Per-column null counts for df, reusing the load-time profile when df is a loaded file"""
+        for file_data in session["files"].values():
+            if file_data["df"] is df and "profile" in file_data:
+                return pd.Series(file_data["profile"]["data_quality"]["missing_values"], dtype="int64")
+        return df.isnull().sum()
+    
+    def _get_cached_model(self, session_id: str, prefix: str):
+        """
+        Get a model bound to a Gemini context cache holding the static dataset prefix
+        Returns None when caching is unavailable so callers send the full prompt instead
+        """
+        if genai_caching is None or self.model is None:
+            return None
+        
+        session = self.session_data[session_id]
+        prefix_key = fingerprint(prefix.encode("utf-8"))
+        cache_entry = session.get("gemini_cache")
+        if cache_entry and cache_entry["key"] == prefix_key and cache_entry["expires_at"] > time.monotonic():
+            return cache_entry["model"]
+        
+        self._delete_gemini_cache(session_id)
+        
+        cached_content = None
+        cached_model = None
+        # The server-side TTL starts before create() returns - measure from before the call
+        created_at = time.monotonic()
+        try:
+            cached_content = genai_caching.CachedContent.create(
+                model=self.model.model_name,
+                contents=[prefix],
+                ttl=timedelta(seconds=GEMINI_CACHE_TTL_SECONDS)
+            )
+            cached_model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+            logger.info(f"🧠 Cached dataset context for session {session_id}")
+        except Exception as e:
+            # Prefix below the model's minimum cacheable size, unsupported model, etc.
+            logger.info(f"ℹ️ Gemini context cache not used: {e}")
+        
+        # Remember failures too, so an uncacheable prefix is not retried on every query
+        session["gemini_cache"] = {
+            "key": prefix_key,
+            "cache": cached_content,
+            "model": cached_model,
+            "expires_at": created_at + GEMINI_CACHE_TTL_SECONDS - GEMINI_CACHE_EXPIRY_MARGIN_SECONDS
+        }
+        return cached_model
+    
+    def _delete_gemini_cache(self, session_id: str):
+        """Release the session's Gemini context cache, if any"""
+        cache_entry = self.session_data.get(session_id, {}).pop("gemini_cache", None)
+        if cache_entry and cache_entry["cache"] is not None:
+            try:
+                cache_entry["cache"].delete()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete Gemini context cache: {e}")
     
-    def _optimize_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Optimize DataFrame data types to reduce memory usage"""
-        df_optimized = df.copy()
+    def _optimize_dtypes(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """
+        Optimize DataFrame data types to reduce memory usage
+        Never deep-copies: with inplace=True columns are replaced on df itself, so the
+        unoptimized data is released column by column; otherwise a shallow copy shares
+        the unchanged columns and only converted ones get new storage
+        """
+        df_optimized = df if inplace else df.copy(deep=False)
         
         # Check if DataFrame is empty to avoid division by zero
         if len(df_optimized) == 0:
             return df_optimized
         
-        for col in df_optimized.columns:
-            col_type = df_optimized[col].dtype
-            
-            # Optimize numeric types
-            if col_type in ['int64']:
-                if df_optimized[col].min() >= -128 and df_optimized[col].max() <= 127:
-                    df_optimized[col] = df_optimized[col].astype('int8')
-                elif df_optimized[col].min() >= -32768 and df_optimized[col].max() <= 32767:
-                    df_optimized[col] = df_optimized[col].astype('int16')
-                elif df_optimized[col].min() >= -2147483648 and df_optimized[col].max() <= 2147483647:
-                    df_optimized[col] = df_optimized[col].astype('int32')
-            
-            elif col_type in ['float64']:
-                df_optimized[col] = pd.to_numeric(df_optimized[col], downcast='float')
-            
-            # Convert repeated strings to category
-            elif col_type == 'object':
-                if df_optimized[col].nunique() / len(df_optimized) < 0.5:  # Less than 50% unique
-                    df_optimized[col] = df_optimized[col].astype('category')
+        # Group columns by dtype once instead of dispatching per column
+        int_cols = df_optimized.select_dtypes(include=['int64']).columns
+        float_cols = df_optimized.select_dtypes(include=['float64']).columns
+        object_cols = df_optimized.select_dtypes(include=['object']).columns
+        
+        target_dtypes = {}
+        
+        # Optimize numeric types - single min/max scan, then the narrowest integer type
+        for col in int_cols:
+            col_min, col_max = _int_column_range(df_optimized[col].to_numpy())
+            for int_type in INT_DOWNCAST_TYPES:
+                type_info = np.iinfo(int_type)
+                if col_min >= type_info.min and col_max <= type_info.max:
+                    target_dtypes[col] = int_type
+                    break
+        
+        # Convert repeated strings to category - distinct counts for all text columns in one call
+        if len(object_cols) > 0:
+            unique_ratio = df_optimized[object_cols].nunique() / len(df_optimized)
+            for col, ratio in unique_ratio.items():
+                if ratio < 0.5:  # Less than 50% unique
+                    target_dtypes[col] = 'category'
+                elif PYARROW_AVAILABLE and pd.api.types.infer_dtype(df_optimized[col], skipna=True) == 'string':
+                    # Mostly-unique pure-text columns go into an Arrow buffer (vectorized .str ops)
+                    target_dtypes[col] = ARROW_STRING_DTYPE
+        
+        for col, dtype in target_dtypes.items():
+            df_optimized[col] = df_optimized[col].astype(dtype)
+        
+        # Float columns go to float32 when their values fit its range (about 7 significant digits kept)
+        for col in float_cols:
+            df_optimized[col] = pd.to_numeric(df_optimized[col], downcast='float')
         
         return df_optimized
     
-    def _create_comprehensive_profile(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Create detailed data profile for LLM understanding"""
+    def _create_comprehensive_profile(
+        self,
+        df: pd.DataFrame,
+        column_stats: Optional[Dict[str, Any]] = None,
+        precise_memory: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Create detailed data profile for LLM understanding
+        column_stats: optional precomputed "missing"/"nunique"/"numeric" stats (see _batch_column_stats)
+        precise_memory: report memory_usage(deep=True) instead of the O(columns) estimate
+        """
+        if not column_stats and POLARS_AVAILABLE and len(df) >= POLARS_MIN_ROWS:
+            column_stats = self._polars_column_stats(df)
+        column_stats = column_stats or {}
+        
+        # Column-wise aggregates computed in one pass each and reused below
+        missing_counts = column_stats["missing"] if "missing" in column_stats else df.isnull().sum()
+        unique_counts = (column_stats["nunique"] if "nunique" in column_stats else df.nunique()).to_dict()
+        numeric_stats = column_stats.get("numeric")
         
         profile = {
             "basic_info": {
                 "rows": len(df),
                 "columns": len(df.columns),
-                "memory_usage_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+                "memory_usage_mb": (
+                    df.memory_usage(deep=True).sum() if precise_memory else self._approx_memory_bytes(df)
+                ) / 1024 / 1024,
                 "column_names": list(df.columns),
                 "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()}
             },
             "data_quality": {
-                "missing_values": df.isnull().sum().to_dict(),
-                "missing_percentage": (df.isnull().sum() / len(df) * 100).to_dict(),
-                "duplicate_rows": df.duplicated().sum(),
-                "unique_values_per_column": {col: df[col].nunique() for col in df.columns}
+                "missing_values": missing_counts.to_dict(),
+                "missing_percentage": (missing_counts / len(df) * 100).to_dict(),
+                "duplicate_rows": self._count_duplicate_rows(df),
+                "unique_values_per_column": unique_counts
             },
             "sample_data": {
                 "head_5": df.head(5).to_dict('records'),
                 "tail_5": df.tail(5).to_dict('records'),
-                "random_sample_10": df.sample(min(10, len(df))).to_dict('records') if len(df) > 0 else []
+                # Generator.choice draws 10 distinct positions without permuting the whole index like df.sample
+                "random_sample_10": df.iloc[
+                    np.random.default_rng().choice(len(df), size=min(10, len(df)), replace=False)
+                ].to_dict('records')
             },
             "statistical_summary": {},
             "categorical_analysis": {},
@@ -848,28 +1883,45 @@ class FullDataAgent:
             try:
                 value_counts = df[col].value_counts().head(10)
                 profile["categorical_analysis"][col] = {
-                    "unique_count": df[col].nunique(),
+                    "unique_count": unique_counts[col],
                     "most_frequent": value_counts.to_dict(),
-                    "sample_values": df[col].dropna().unique()[:20].tolist()
+                    "sample_values": self._first_unique_values(df[col], 20)
                 }
             except Exception as e:
                 logger.warning(f"Error analyzing categorical column {col}: {e}")
         
         # Analyze numerical columns
         numerical_cols = df.select_dtypes(include=['number']).columns
-        for col in numerical_cols:
+        if len(numerical_cols) > 0:
+            numeric_df = df[numerical_cols]
             try:
-                profile["numerical_analysis"][col] = {
-                    "min": float(df[col].min()) if not pd.isna(df[col].min()) else None,
-                    "max": float(df[col].max()) if not pd.isna(df[col].max()) else None,
-                    "mean": float(df[col].mean()) if not pd.isna(df[col].mean()) else None,
-                    "median": float(df[col].median()) if not pd.isna(df[col].median()) else None,
-                    "std": float(df[col].std()) if not pd.isna(df[col].std()) else None,
-                    "quartiles": df[col].quantile([0.25, 0.5, 0.75]).to_dict(),
-                    "outliers_count": len(df[df[col] > df[col].quantile(0.95)]) if len(df) > 0 else 0
-                }
+                # One aggregation and one quantile pass over all numeric columns
+                if numeric_stats is None:
+                    numeric_stats = numeric_df.agg(list(NUMERIC_PROFILE_STATS)).unstack()
+                quantiles = numeric_df.quantile([0.25, 0.5, 0.75, 0.95])
+                outlier_counts = (numeric_df > quantiles.loc[0.95]).sum()
             except Exception as e:
-                logger.warning(f"Error analyzing numerical column {col}: {e}")
+                # Fall back to per-column passes so one bad column doesn't drop the rest
+                logger.warning(f"Batched numerical analysis failed, analyzing columns one by one: {e}")
+                numeric_stats = quantiles = outlier_counts = None
+
+            for col in numerical_cols:
+                try:
+                    if quantiles is not None:
+                        col_stats = {stat: numeric_stats[(col, stat)] for stat in NUMERIC_PROFILE_STATS}
+                        col_quantiles = quantiles[col]
+                        col_outliers = outlier_counts[col]
+                    else:
+                        col_stats = numeric_df[col].agg(list(NUMERIC_PROFILE_STATS)).to_dict()
+                        col_quantiles = numeric_df[col].quantile([0.25, 0.5, 0.75, 0.95])
+                        col_outliers = (numeric_df[col] > col_quantiles.loc[0.95]).sum()
+                    profile["numerical_analysis"][col] = {
+                        **{stat: float(value) if not pd.isna(value) else None for stat, value in col_stats.items()},
+                        "quartiles": col_quantiles.loc[[0.25, 0.5, 0.75]].to_dict(),
+                        "outliers_count": int(col_outliers)
+                    }
+                except Exception as e:
+                    logger.warning(f"Error analyzing numerical column {col}: {e}")
         
         # Analyze temporal columns
         datetime_cols = df.select_dtypes(include=['datetime64']).columns
@@ -886,17 +1938,20 @@ class FullDataAgent:
         # Analyze relationships (correlations)
         if len(numerical_cols) > 1:
             try:
-                corr_matrix = df[numerical_cols].corr()
-                high_correlations = []
-                for i in range(len(corr_matrix.columns)):
-                    for j in range(i+1, len(corr_matrix.columns)):
-                        corr_val = corr_matrix.iloc[i, j]
-                        if abs(corr_val) > 0.7 and not pd.isna(corr_val):
-                            high_correlations.append({
-                                "column1": corr_matrix.columns[i],
-                                "column2": corr_matrix.columns[j],
-                                "correlation": float(corr_val)
-                            })
+                corr_matrix = self._correlation_matrix(df[numerical_cols])
+                corr_values = corr_matrix.to_numpy()
+                corr_columns = corr_matrix.columns.to_numpy()
+                # Upper triangle only; NaN compares False so it never passes the threshold
+                with np.errstate(invalid='ignore'):
+                    strong = np.triu(np.abs(corr_values) > 0.7, k=1)
+                high_correlations = [
+                    {
+                        "column1": corr_columns[i],
+                        "column2": corr_columns[j],
+                        "correlation": float(corr_values[i, j])
+                    }
+                    for i, j in zip(*np.nonzero(strong))
+                ]
                 profile["relationships"]["high_correlations"] = high_correlations
             except Exception as e:
                 logger.warning(f"Error analyzing correlations: {e}")
@@ -904,16 +1959,61 @@ class FullDataAgent:
         # Clean all NaN values from the profile before returning
         return self._clean_nan_values(profile)
     
+    def _first_unique_values(self, series: pd.Series, limit: int) -> List[Any]:
+        """
+        First `limit` distinct non-null values in order of appearance
+        Scans growing head slices, so long columns are not copied by dropna() just to keep a few values
+        """
+        scan_rows = limit * 50
+        while True:
+            head = series.iloc[:scan_rows]
+            values = head.dropna().unique()
+            if len(values) >= limit or scan_rows >= len(series):
+                return values[:limit].tolist()
+            scan_rows *= 8
+    
+    def _correlation_matrix(self, numeric_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Pearson correlation matrix
+        Without missing values this is one standardize + matrix product; otherwise pandas' pairwise corr
+        """
+        # float64 with NA mapped to NaN so nullable (Int64/Float64) columns convert
+        values = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+        if np.isnan(values).any():
+            return numeric_df.corr()
+        
+        centered = values - values.mean(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Constant columns give NaN, matching pandas
+            standardized = centered / centered.std(axis=0)
+        corr = (standardized.T @ standardized) / len(standardized)
+        return pd.DataFrame(corr, index=numeric_df.columns, columns=numeric_df.columns)
+    
+    def _count_duplicate_rows(self, df: pd.DataFrame) -> int:
+        """
+        Count fully duplicated rows
+        Large frames compare one 64-bit hash per row instead of building row tuples
+        """
+        if len(df) <= DUPLICATE_SCAN_MAX_ROWS:
+            return int(df.duplicated().sum())
+        try:
+            return int(pd.util.hash_pandas_object(df, index=False).duplicated().sum())
+        except TypeError:
+            # Unhashable cell values - fall back to the exact scan
+            return int(df.duplicated().sum())
+    
     def _clean_nan_values(self, obj):
         """Recursively clean NaN values from nested dictionaries and lists for JSON serialization"""
-        import math
-        
         if isinstance(obj, dict):
             return {k: self._clean_nan_values(v) for k, v in obj.items()}
         elif isinstance(obj, list):
             return [self._clean_nan_values(item) for item in obj]
-        elif isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-            return None
+        elif isinstance(obj, float):
+            # Covers np.float64 too; NaN and +/-inf are not finite
+            return obj if math.isfinite(obj) else None
+        elif obj is None or isinstance(obj, (str, int)):
+            # Most common leaves - skip the pd.isna dispatch
+            return obj
         elif pd.isna(obj):
             return None
         else:
@@ -965,11 +2065,18 @@ class FullDataAgent:
                 logger.info(f"📊 Detected Excel operation request with operations: {operations}")
                 return self._handle_excel_operation(session_id, df, user_query, operations)
             
-            # Build comprehensive context for LLM with multi-file awareness
-            context = self._build_multi_file_context(session_id, df, user_query)
+            # Build comprehensive context for LLM with multi-file awareness.
+            # The dataset part is stable across queries, so it goes into a Gemini
+            # context cache when possible and only the history is sent per prompt.
+            data_context = self._build_data_context(session_id, df)
+            cached_model = self._get_cached_model(session_id, data_context)
+            if cached_model is not None:
+                context = self._build_history_context(session_id)
+            else:
+                context = self._build_multi_file_context(session_id, df, user_query)
             
             # Generate code using LLM
-            code_response = self._generate_code_with_llm(context, user_query)
+            code_response = self._generate_code_with_llm(context, user_query, model=cached_model)
             
             if not code_response["success"]:
                 return code_response
@@ -1002,30 +2109,35 @@ class FullDataAgent:
     
     def _build_llm_context(self, df: pd.DataFrame, profile: Dict, user_query: str) -> str:
         """Build comprehensive context for LLM including full data understanding"""
+        # Formatted once - the column list appears twice in the prompt
+        columns_repr = repr(list(df.columns))
+        numerical_analysis = profile["numerical_analysis"]
+        categorical_analysis = profile["categorical_analysis"]
+        missing_percentage = profile["data_quality"]["missing_percentage"]
         
         context_parts = [
             "# FULL EXCEL DATA ANALYSIS CONTEXT",
             "",
             "## Dataset Overview:",
             f"- Shape: {len(df)} rows × {len(df.columns)} columns",
-            f"- Memory Usage: {df.memory_usage(deep=True).sum() / 1024 / 1024:.1f}MB",
-            f"- Columns: {list(df.columns)}",
+            f"- Memory Usage: {self._approx_memory_bytes(df) / 1024 / 1024:.1f}MB",
+            f"- Columns: {columns_repr}",
             "",
             "## Column Details:"
         ]
         
         # Add detailed column information
-        for col in df.columns:
-            col_info = f"- **{col}** ({df[col].dtype})"
-            if col in profile["numerical_analysis"]:
-                stats = profile["numerical_analysis"][col]
+        for col, dtype in df.dtypes.items():
+            col_info = f"- **{col}** ({dtype})"
+            if col in numerical_analysis:
+                stats = numerical_analysis[col]
                 col_info += f" | Range: {stats.get('min', 'N/A')} to {stats.get('max', 'N/A')} | Mean: {stats.get('mean', 'N/A'):.2f}"
-            elif col in profile["categorical_analysis"]:
-                stats = profile["categorical_analysis"][col]
+            elif col in categorical_analysis:
+                stats = categorical_analysis[col]
                 col_info += f" | {stats['unique_count']} unique values | Top: {list(stats['most_frequent'].keys())[:3]}"
             
             # Add missing value info
-            missing_pct = profile["data_quality"]["missing_percentage"].get(col, 0)
+            missing_pct = missing_percentage.get(col, 0)
             if missing_pct > 0:
                 col_info += f" | Missing: {missing_pct:.1f}%"
             
@@ -1036,13 +2148,13 @@ class FullDataAgent:
             "## Sample Data (First 5 rows):"
         ])
         
-        # Add sample data in a readable format
-        sample_df = df.head(5)
-        for i, row in sample_df.iterrows():
-            row_str = " | ".join([f"{col}: {row[col]}" for col in df.columns[:6]])  # Limit to first 6 columns
-            if len(df.columns) > 6:
-                row_str += " | ..."
-            context_parts.append(f"Row {i+1}: {row_str}")
+        # Add sample data in a readable format (first 6 columns, read as plain tuples)
+        sample_df = df.iloc[:5, :6]
+        sample_columns = list(sample_df.columns)
+        row_suffix = " | ..." if len(df.columns) > 6 else ""
+        for i, values in zip(sample_df.index, sample_df.itertuples(index=False, name=None)):
+            row_str = " | ".join(f"{col}: {value}" for col, value in zip(sample_columns, values))
+            context_parts.append(f"Row {i+1}: {row_str}{row_suffix}")
         
         # Add correlations if any
         if profile["relationships"].get("high_correlations"):
@@ -1057,7 +2169,7 @@ class FullDataAgent:
             "",
             "## Data Quality Issues:",
             f"- Duplicate rows: {profile['data_quality']['duplicate_rows']}",
-            f"- Columns with missing values: {len([col for col, pct in profile['data_quality']['missing_percentage'].items() if pct > 0])}"
+            f"- Columns with missing values: {sum(1 for pct in missing_percentage.values() if pct > 0)}"
         ])
         
         context_parts.extend([
@@ -1076,7 +2188,7 @@ class FullDataAgent:
             "",
             "## Available DataFrame: 'df'",
             f"df.shape = {df.shape}",
-            f"df.columns = {list(df.columns)}",
+            f"df.columns = {columns_repr}",
             "",
             "## Analysis Approach:",
             "- Don't just answer the question - provide valuable insights",
@@ -1090,8 +2202,39 @@ class FullDataAgent:
         
         return "\n".join(context_parts)
     
+    def _model_cache_identity(self, model) -> str:
+        """Model name plus bound context cache, so responses from different prefixes never share a cache entry"""
+        cached_content = getattr(model, "cached_content", None)
+        return f"{getattr(model, 'model_name', '')}|{getattr(cached_content, 'name', cached_content) or ''}"
+    
     def _classify_query_intent_with_llm(self, user_query: str) -> str:
-        """Use LLM to intelligently classify user query intent"""
+        """
+        Use LLM to intelligently classify user query intent
+        Obvious shape/column questions skip the LLM; repeated queries are answered from an LRU cache
+        """
+        normalized_query = " ".join(user_query.lower().split())
+        if SIMPLE_QUERY_PATTERN.fullmatch(normalized_query):
+            return "simple"
+        
+        with self._intent_cache_lock:
+            cached = self._intent_cache.get(normalized_query)
+            if cached is not None:
+                self._intent_cache.move_to_end(normalized_query)
+                logger.info(f"🎯 Reusing classification for '{user_query[:30]}...': {cached}")
+                return cached
+        
+        classification = self._classify_query_intent_uncached(normalized_query)
+        if classification is not None:
+            with self._intent_cache_lock:
+                self._intent_cache[normalized_query] = classification
+                while len(self._intent_cache) > QUERY_INTENT_CACHE_SIZE:
+                    self._intent_cache.popitem(last=False)
+            return classification
+        # Fallback to complex analysis for safety (not cached so the LLM is asked again next time)
+        return "complex"
+    
+    def _classify_query_intent_uncached(self, user_query: str) -> Optional[str]:
+        """Ask the LLM for "simple"/"complex"; None when the answer is unclear or the call fails"""
         
         intent_prompt = f"""
 You are an intelligent query classifier. Analyze the user's query and determine if they want a SIMPLE direct answer or COMPLEX comprehensive analysis.
@@ -1136,33 +2279,31 @@ Respond with ONLY one word: "simple" or "complex"
 """
         
         try:
-            response = self.model.generate_content(
+            response_text = self.intent_parser.generate_text(
                 intent_prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,  # Low temperature for consistent classification
-                    top_p=0.8,
-                    top_k=10
-                )
+                temperature=0.1,  # Low temperature for consistent classification
+                top_p=0.8,
+                top_k=10
             )
             
-            classification = response.text.strip().lower()
+            classification = response_text.strip().lower()
             
             # Validate response
             if classification in ["simple", "complex"]:
                 logger.info(f"🎯 LLM classified query '{user_query[:30]}...' as: {classification}")
                 return classification
             else:
-                # Fallback to complex if unclear
+                # Caller falls back to complex if unclear
                 logger.warning(f"⚠️ LLM classification unclear: '{classification}', defaulting to complex")
-                return "complex"
+                return None
                 
         except Exception as e:
             logger.error(f"❌ Error in LLM intent classification: {e}")
-            # Fallback to complex analysis for safety
-            return "complex"
+            return None
     
-    def _generate_code_with_llm(self, context: str, user_query: str) -> Dict[str, Any]:
+    def _generate_code_with_llm(self, context: str, user_query: str, model=None) -> Dict[str, Any]:
         """Generate Python code using LLM based on full data context"""
+        model = model or self.model
         
         # Use LLM to intelligently classify query intent
         intent_classification = self._classify_query_intent_with_llm(user_query)
@@ -1355,30 +2496,27 @@ try:
     # Search for student by name (case-insensitive)
     name_to_find = "MIDHUN"  # Replace with actual name from query
     
-    # Search in all text columns for the name
-    found_rows = []
-    for col in df.columns:
-        if df[col].dtype == 'object':  # Text columns
-            mask = df[col].astype(str).str.upper().str.contains(name_to_find, na=False)
-            if mask.any():
-                found_rows.extend(df[mask].index.tolist())
+    # Search all text columns at once: one case-insensitive literal match per column, OR-ed per row
+    text_df = df.select_dtypes(include=['object', 'string', 'category'])
+    mask = text_df.apply(
+        lambda s: s.astype(str).str.contains(name_to_find, case=False, na=False, regex=False)
+    ).any(axis=1)
+    found_records = int(mask.sum())
     
-    if found_rows:
-        # Remove duplicates and get unique rows
-        found_rows = list(set(found_rows))
-        result_df = df.iloc[found_rows]
+    if found_records:
+        result_df = df.loc[mask]
         
         # Generate dynamic response for successful search
         search_response = self._generate_dynamic_search_response(
             search_term=name_to_find,
-            found_records=len(found_rows),
+            found_records=found_records,
             user_query=user_query,
             success=True
         )
         print(search_response)
         
-        for idx, row in result_df.iterrows():
-            print(f"Row {{idx}}: {{row.to_dict()}}")
+        for idx, record in zip(result_df.index, result_df.to_dict('records')):
+            print(f"Row {{idx}}: {{record}}")
     else:
         # Generate dynamic response for no results found
         no_results_response = self._generate_dynamic_search_response(
@@ -1472,16 +2610,25 @@ Generate intelligent, comprehensive Python code:
 """
         
         try:
-            response = self.model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,  # Low temperature for code generation
-                    top_p=0.9,
-                    top_k=40
+            cache_key = fingerprint(f"{self._model_cache_identity(model)}|{prompt}".encode("utf-8"))
+            with self._code_response_cache_lock:
+                response_text = self._code_response_cache.get(cache_key)
+                if response_text is not None:
+                    self._code_response_cache.move_to_end(cache_key)
+                    logger.info("⚡ Reusing cached code generation for identical prompt")
+            
+            if response_text is None:
+                response = model.generate_content(
+                    prompt,
+                    generation_config=genai.types.GenerationConfig(
+                        temperature=0.1,  # Low temperature for code generation
+                        top_p=0.9,
+                        top_k=40
+                    )
                 )
-            )
-            
-            response_text = response.text
+                
+                response_text = response.text
+                self._remember_good_model()
             
             # Extract code from response
             code_blocks = []
@@ -1503,6 +2650,12 @@ Generate intelligent, comprehensive Python code:
             if not code_blocks:
                 return {"success": False, "error": "No Python code found in LLM response"}
             
+            # Only responses that yielded code are worth replaying
+            with self._code_response_cache_lock:
+                self._code_response_cache[cache_key] = response_text
+                while len(self._code_response_cache) > GENERATED_CODE_CACHE_SIZE:
+                    self._code_response_cache.popitem(last=False)
+            
             # Use the first (or combined) code block
             generated_code = '\n'.join(code_blocks)
             
@@ -1528,21 +2681,27 @@ Generate intelligent, comprehensive Python code:
             logger.error(f"❌ Error generating code with LLM: {e}")
             return {"success": False, "error": f"LLM code generation failed: {str(e)}"}
     
+    def _compile_generated_code(self, code: str) -> types.CodeType:
+        """Compile generated code once; identical code (e.g. a replayed LLM response) reuses the code object"""
+        with self._compiled_code_cache_lock:
+            code_obj = self._compiled_code_cache.get(code)
+            if code_obj is not None:
+                self._compiled_code_cache.move_to_end(code)
+                return code_obj
+        
+        code_obj = compile(code, "<generated>", "exec")
+        with self._compiled_code_cache_lock:
+            self._compiled_code_cache[code] = code_obj
+            while len(self._compiled_code_cache) > COMPILED_CODE_CACHE_SIZE:
+                self._compiled_code_cache.popitem(last=False)
+        return code_obj
+    
     def _execute_code_safely(self, df: pd.DataFrame, code: str, session_id: str) -> Dict[str, Any]:
         """Execute generated Python code safely on the full DataFrame"""
         
         try:
             # Create safe execution environment with necessary imports pre-loaded
-            import os
-            import sys
-            from io import StringIO
-            
-            # Configure matplotlib for web display (non-interactive backend)
-            import matplotlib
-            matplotlib.use('Agg')  # Set backend before importing pyplot
-            plt.switch_backend('Agg')  # Use non-interactive backend
-            plt.ioff()  # Turn off interactive mode
-            
+            # matplotlib is configured once at import (Agg backend, interactive mode off)
             safe_globals = {
                 'df': df,
                 'pd': pd,
@@ -1553,7 +2712,7 @@ Generate intelligent, comprehensive Python code:
                 'datetime': datetime,
                 'os': os,
                 'outputs_dir': str(self.outputs_dir),
-                'StringIO': StringIO,
+                'StringIO': io.StringIO,
                 '__builtins__': {
                     'len': len,
                     'str': str,
@@ -1594,9 +2753,10 @@ Generate intelligent, comprehensive Python code:
             safe_locals = {}
             
             # Capture output by redirecting stdout
-            output_buffer = io.StringIO()
+            output_buffer = _ListWriter()
             original_stdout = sys.stdout
             sys.stdout = output_buffer
+            figures_before = set(plt.get_fignums())
             
             try:
                 # Execute code
@@ -1607,13 +2767,13 @@ Generate intelligent, comprehensive Python code:
                 self.outputs_dir.mkdir(exist_ok=True)
                 
                 # Count PNG files before execution
-                png_files_before = len(list(self.outputs_dir.glob("*.png")))
+                png_files_before = _count_png_files(self.outputs_dir)
                 logger.info(f"📈 PNG files before execution: {png_files_before}")
                 
-                exec(code, safe_globals, safe_locals)
+                exec(self._compile_generated_code(code), safe_globals, safe_locals)
                 
                 # Count PNG files after execution
-                png_files_after = len(list(self.outputs_dir.glob("*.png")))
+                png_files_after = _count_png_files(self.outputs_dir)
                 logger.info(f"📈 PNG files after execution: {png_files_after}")
                 
                 if png_files_after == png_files_before:
@@ -1621,7 +2781,6 @@ Generate intelligent, comprehensive Python code:
                 
             except Exception as exec_error:
                 logger.error(f"❌ Code execution error: {exec_error}")
-                import traceback
                 error_traceback = traceback.format_exc()
                 logger.error(f"❌ Full traceback: {error_traceback}")
                 # Add error to output
@@ -1629,6 +2788,9 @@ Generate intelligent, comprehensive Python code:
             finally:
                 # Restore stdout
                 sys.stdout = original_stdout
+                # Free figures the code left open so they do not accumulate across runs
+                for figure_num in set(plt.get_fignums()) - figures_before:
+                    plt.close(figure_num)
             
             # Collect results
             result = {
@@ -1643,74 +2805,33 @@ Generate intelligent, comprehensive Python code:
             for var_name, var_value in safe_locals.items():
                 if not var_name.startswith('_'):
                     if isinstance(var_value, pd.DataFrame):
-                        # Store DataFrame info and sample
+                        # Store DataFrame info and sample (split form: one list per row, no per-row dicts)
+                        head = var_value.head(10)
                         result["dataframes"][var_name] = {
                             "shape": var_value.shape,
                             "columns": list(var_value.columns),
-                            "sample": var_value.head(10).to_dict('records') if len(var_value) > 0 else [],
-                            "dtypes": {col: str(dtype) for col, dtype in var_value.dtypes.items()}
+                            "sample": head.to_dict(orient='split', index=False) if len(head) else {"columns": [], "data": []},
+                            "dtypes": dict(zip(map(str, var_value.columns), var_value.dtypes.astype(str)))
                         }
-                    elif isinstance(var_value, (int, float, str, bool, list, dict)):
+                    elif isinstance(var_value, RESULT_VALUE_TYPES):
                         result["variables"][var_name] = var_value
-                    elif hasattr(var_value, '__str__') and len(str(var_value)) < 1000:
-                        result["variables"][var_name] = str(var_value)
+                    elif isinstance(var_value, RESULT_SKIPPED_TYPES):
+                        continue
+                    elif isinstance(var_value, (tuple, set, frozenset)) and len(var_value) > RESULT_STR_MAX_ITEMS:
+                        # Too long to report - skip stringifying it just to measure
+                        continue
+                    else:
+                        value_str = str(var_value)
+                        if len(value_str) < RESULT_STR_MAX_CHARS:
+                            result["variables"][var_name] = value_str
             
             # Check for chart data in output instead of PNG files
             output_text = result["execution_output"]
-            chart_data_list = []
-            
-            # Extract chart data from output
-            import re
-            
-            def extract_json_from_line(line):
-                """Extract complete JSON object from a line containing [CHART_DATA]"""
-                if '[CHART_DATA]' not in line:
-                    return None
-                
-                json_start = line.find('[CHART_DATA]') + len('[CHART_DATA]')
-                json_part = line[json_start:].strip()
-                
-                if not json_part.startswith('{'):
-                    return None
-                
-                # Count braces to find the complete JSON object
-                brace_count = 0
-                end_pos = 0
-                
-                for i, char in enumerate(json_part):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end_pos = i + 1
-                            break
-                
-                if end_pos > 0:
-                    return json_part[:end_pos]
-                return None
-            
-            chart_matches = []
-            lines = output_text.split('\n')
-            for line in lines:
-                if '[CHART_DATA]' in line:
-                    json_data = extract_json_from_line(line)
-                    if json_data:
-                        chart_matches.append(json_data)
             
-            for match in chart_matches:
-                try:
-                    import json
-                    chart_config = json.loads(match)
-                    chart_data_list.append(chart_config)
-                    logger.info(f"📊 Found chart data: {chart_config.get('type', 'unknown')} - {chart_config.get('title', 'untitled')}")
-                except json.JSONDecodeError as e:
-                    logger.warning(f"⚠️ Failed to parse chart data: {e}")
+            # Extract chart data and clean up chart data markers from output text
+            chart_data_list, cleaned_output = self._extract_chart_data(output_text)
             
             result["charts"] = chart_data_list
-            
-            # Clean up chart data markers from output text
-            cleaned_output = re.sub(r'\[CHART_DATA\][^\n]*', '', output_text)
             result["execution_output"] = cleaned_output.strip()
             
             if chart_data_list:
@@ -1732,6 +2853,131 @@ Generate intelligent, comprehensive Python code:
                 "traceback": traceback.format_exc()
             }
     
+    def _sheet_cache_dir(self, workbook_path: Path) -> Path:
+        """Directory holding the Feather copies of a generated workbook's sheets"""
+        return Path(self.outputs_dir) / SHEET_CACHE_DIRNAME / Path(workbook_path).stem
+    
+    def _write_sheet_cache(self, workbook_path: Path, sheets: List[Dict]):
+        """
+        Save each sheet of a just-written workbook as Feather so internal re-reads skip the Excel parser
+        Best effort: skipped without pyarrow or when a frame cannot be stored as Feather
+        """
+        if not PYARROW_AVAILABLE:
+            return
+        
+        cache_dir = self._sheet_cache_dir(workbook_path)
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            for idx, sheet in enumerate(sheets):
+                sheet_df = sheet["df"].reset_index(drop=True)
+                sheet_df.columns = [str(col) for col in sheet_df.columns]
+                sheet_df.to_feather(cache_dir / f"{idx}.feather")
+            
+            # Written last: a manifest means every sheet file is complete
+            manifest = {
+                "sheet_names": [sheet["sheet_name"] for sheet in sheets],
+                "workbook_mtime_ns": Path(workbook_path).stat().st_mtime_ns
+            }
+            (cache_dir / SHEET_CACHE_MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+            logger.info(f"  💾 Cached {len(sheets)} sheets as Feather for {Path(workbook_path).name}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not cache sheets as Feather: {e}")
+    
+    def _read_sheet_cache(self, workbook_path: Path) -> Optional[List[Dict]]:
+        """Load a workbook's sheets from its Feather cache; None when missing or older than the workbook"""
+        if not PYARROW_AVAILABLE:
+            return None
+        
+        cache_dir = self._sheet_cache_dir(workbook_path)
+        manifest_path = cache_dir / SHEET_CACHE_MANIFEST
+        try:
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if manifest["workbook_mtime_ns"] != Path(workbook_path).stat().st_mtime_ns:
+                return None
+            
+            sheets = []
+            for idx, sheet_name in enumerate(manifest["sheet_names"]):
+                df = pd.read_feather(cache_dir / f"{idx}.feather")
+                sheets.append({"sheet_name": sheet_name, "df": df})
+                logger.info(f"  📄 Loaded sheet '{sheet_name}' from Feather cache: {len(df)} rows")
+            return sheets
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable Feather sheet cache: {e}")
+            return None
+    
+    def _extract_chart_data(self, output_text: str) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        Parse the JSON object following each [CHART_DATA] marker (first marker per line)
+        and strip every marker through the end of its line in the same pass
+        
+        Returns:
+            (chart config list, output text without markers)
+        """
+        chart_data_list = []
+        clean_parts = []
+        tag_length = len(CHART_DATA_TAG)
+        text_length = len(output_text)
+        pos = 0
+        while True:
+            tag_pos = output_text.find(CHART_DATA_TAG, pos)
+            if tag_pos < 0:
+                break
+            clean_parts.append(output_text[pos:tag_pos])
+            
+            line_end = output_text.find('\n', tag_pos)
+            if line_end < 0:
+                line_end = text_length
+            pos = line_end
+            
+            json_start = tag_pos + tag_length
+            while json_start < line_end and output_text[json_start].isspace():
+                json_start += 1
+            if json_start >= line_end or output_text[json_start] != '{':
+                continue
+            
+            try:
+                chart_config, json_end = _CHART_DECODER.raw_decode(output_text, json_start)
+            except json.JSONDecodeError as e:
+                logger.warning(f"⚠️ Failed to parse chart data: {e}")
+                continue
+            if json_end > line_end:
+                # The object must close on the marker's line
+                continue
+            
+            chart_data_list.append(chart_config)
+            logger.info(f"📊 Found chart data: {chart_config.get('type', 'unknown')} - {chart_config.get('title', 'untitled')}")
+        
+        clean_parts.append(output_text[pos:])
+        return chart_data_list, "".join(clean_parts)
+    
+    def _remember_last_file_sheets(self, last_file: Dict[str, Any], sheets: List[Dict]):
+        """
+        Keep a generated workbook's parsed sheets on its last_generated_file entry
+        Valid while the file's mtime is unchanged; frames get the RangeIndex a re-read would give
+        """
+        try:
+            mtime_ns = Path(last_file["path"]).stat().st_mtime_ns
+        except (KeyError, OSError):
+            return
+        last_file["_sheets_cache"] = {
+            "mtime_ns": mtime_ns,
+            "sheets": [(sheet["sheet_name"], sheet["df"].reset_index(drop=True)) for sheet in sheets]
+        }
+    
+    def _recall_last_file_sheets(self, last_file: Dict[str, Any]) -> Optional[List[Dict]]:
+        """Sheets remembered for last_file, or None when absent or the file changed on disk"""
+        cached = last_file.get("_sheets_cache")
+        if not cached:
+            return None
+        try:
+            if Path(last_file["path"]).stat().st_mtime_ns != cached["mtime_ns"]:
+                return None
+        except OSError:
+            return None
+        return [{"sheet_name": sheet_name, "df": df} for sheet_name, df in cached["sheets"]]
+    
     def _load_all_sheets_from_last_file(self, session_id: str) -> Optional[List[Dict]]:
         """
         Load all sheets from last generated file
@@ -1745,30 +2991,120 @@ Generate intelligent, comprehensive Python code:
                 return None
             
             file_path = Path(last_file["path"])
+            
+            # The memo's mtime check is the only stat on this path - a missing file fails it too
+            remembered_sheets = self._recall_last_file_sheets(last_file)
+            if remembered_sheets is not None:
+                logger.info(f"📂 Reusing {len(remembered_sheets)} parsed sheets of: {file_path.name}")
+                return remembered_sheets
+            
             if not file_path.exists():
                 logger.warning(f"⚠️ Last generated file not found: {file_path}")
                 return None
             
             logger.info(f"📂 Loading all sheets from: {file_path.name}")
             
-            # Load all sheets from Excel file
-            xl_file = pd.ExcelFile(file_path)
-            sheets = []
-            
-            for sheet_name in xl_file.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                sheets.append({
-                    "sheet_name": sheet_name,
-                    "df": df
-                })
-                logger.info(f"  📄 Loaded sheet '{sheet_name}': {len(df)} rows")
+            sheets = self._read_sheet_cache(file_path)
+            if sheets is None:
+                # Load all sheets from Excel file in one pass over the open workbook
+                with self._open_excel_file(file_path) as xl_file:
+                    all_sheets = pd.read_excel(xl_file, sheet_name=None)
+                
+                sheets = []
+                for sheet_name, df in all_sheets.items():
+                    sheets.append({
+                        "sheet_name": sheet_name,
+                        "df": df
+                    })
+                    logger.info(f"  📄 Loaded sheet '{sheet_name}': {len(df)} rows")
             
+            self._remember_last_file_sheets(last_file, sheets)
             return sheets
             
         except Exception as e:
             logger.error(f"❌ Error loading sheets from last file: {e}")
             return None
     
+    def _contiguous_subtotal_groups(
+        self,
+        df: pd.DataFrame,
+        group_by: str,
+        aggregate_column: str,
+        function: str,
+        merge_blank_runs: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Contiguous runs of equal group_by values with their COUNT/SUM/AVERAGE of aggregate_column
+        Rows are sheet rows (header on row 1). Blank group cells join the following run when merge_blank_runs,
+        otherwise they belong to no group; trailing blanks never get a subtotal.
+        label_row is the group's first non-blank row, whose value names the subtotal
+        """
+        num_rows = len(df)
+        if num_rows == 0:
+            return []
+        
+        group_values = df[group_by]
+        previous = group_values.shift()
+        blank = group_values.isna()
+        starts_run = ((group_values != previous) & ~(blank & previous.isna())).to_numpy(dtype=bool, copy=True)
+        starts_run[0] = True
+        run_starts = np.flatnonzero(starts_run)
+        run_ends = np.append(run_starts[1:], num_rows)
+        run_blank = blank.to_numpy(dtype=bool)[run_starts]
+        
+        # Merge blank runs into the run that follows them
+        spans = []
+        pending_start = None
+        for start, end, is_blank in zip(run_starts.tolist(), run_ends.tolist(), run_blank.tolist()):
+            if is_blank:
+                if merge_blank_runs and pending_start is None:
+                    pending_start = start
+                continue
+            spans.append((start if pending_start is None else pending_start, end, start))
+            pending_start = None
+        if not spans:
+            return []
+        
+        group_ids = np.full(num_rows, -1, dtype=np.int64)
+        for group_id, (start, end, _) in enumerate(spans):
+            group_ids[start:end] = group_id
+        in_group = group_ids >= 0
+        
+        agg_values = df[aggregate_column]
+        if function == 'COUNT':
+            per_group = agg_values.notna()[in_group].groupby(group_ids[in_group]).sum()
+        else:
+            # Blank cells count as 0 for SUM and AVERAGE, as in the cell-by-cell version
+            numeric = pd.to_numeric(agg_values).fillna(0).astype(float)[in_group]
+            grouped = numeric.groupby(group_ids[in_group])
+            per_group = grouped.sum() if function == 'SUM' else grouped.mean()
+        
+        return [
+            {'start_row': start + 2, 'end_row': end + 1, 'label_row': label + 2, 'value': value}
+            for (start, end, label), value in zip(spans, per_group.tolist())
+        ]
+    
+    def _highlight_condition_mask(self, column_values: pd.Series, operator: str, value: Any) -> np.ndarray:
+        """
+        Boolean row mask for a highlight condition, comparing cells by their str() form
+        Supports ==, !=, contains (case-insensitive) and in; unknown operators match nothing
+        """
+        # Boxed str() per value (one C-level map) keeps NaN -> 'nan' and full Timestamp text,
+        # which astype(str) does not guarantee across dtypes and pandas versions
+        text = column_values.astype(object).map(str)
+        
+        if operator == '==':
+            mask = text == str(value)
+        elif operator == '!=':
+            mask = text != str(value)
+        elif operator == 'contains':
+            mask = text.str.lower().str.contains(str(value).lower(), regex=False)
+        elif operator == 'in':
+            mask = text.isin([str(v) for v in value])
+        else:
+            return np.zeros(len(column_values), dtype=bool)
+        return mask.to_numpy(dtype=bool)
+    
     def _apply_formatting_to_multi_sheet_file(
         self,
         session_id: str,
@@ -1781,11 +3117,7 @@ Generate intelligent, comprehensive Python code:
         Apply formatting operations (highlighting) to a specific sheet in a multi-sheet file
         """
         try:
-            from datetime import datetime
-            import openpyxl
-            from openpyxl.styles import PatternFill
-            
-            timestamp = int(datetime.now().timestamp())
+            timestamp = _next_file_id()
             filename = f"excel_formatted_{timestamp}.xlsx"
             output_path = Path(self.outputs_dir) / filename
             
@@ -1801,8 +3133,11 @@ Generate intelligent, comprehensive Python code:
                     )
                     logger.info(f"  ✅ Saved sheet '{sheet['sheet_name']}': {len(sheet['df'])} rows")
             
+            # Subtotals insert rows into the workbook below, so only style-only outputs match the frames
+            write_sheet_cache = 'subtotals' not in operations
+            
             # Step 2: Apply formatting to target sheet using openpyxl
-            wb = openpyxl.load_workbook(output_path)
+            wb = self._open_source_for_update(output_path)
             ws = wb[target_sheet]
             
             # Get target sheet DataFrame for condition checking
@@ -1817,7 +3152,6 @@ Generate intelligent, comprehensive Python code:
             
             # Apply subtotals if present
             if 'subtotals' in operations:
-                from openpyxl.styles import Font
                 subtotal_spec = operations['subtotals']
                 group_by = subtotal_spec.get('group_by')
                 aggregate_column = subtotal_spec.get('aggregate_column')
@@ -1830,57 +3164,23 @@ Generate intelligent, comprehensive Python code:
                     group_col_idx = list(target_df.columns).index(group_by) + 1
                     agg_col_idx = list(target_df.columns).index(aggregate_column) + 1
                     
-                    # Track groups
-                    groups = []
-                    current_group = None
-                    group_start_row = 2
+                    groups = self._contiguous_subtotal_groups(target_df, group_by, aggregate_column, function)
                     
-                    for row_idx in range(2, ws.max_row + 1):
-                        group_value = ws.cell(row=row_idx, column=group_col_idx).value
-                        
-                        if current_group is not None and group_value != current_group:
-                            groups.append({
-                                'name': current_group,
-                                'start_row': group_start_row,
-                                'end_row': row_idx - 1,
-                                'insert_at': row_idx
-                            })
-                            group_start_row = row_idx
-                        
-                        current_group = group_value
+                    logger.info(f"  📊 Found {len(groups)} groups for subtotals")
                     
-                    if current_group is not None:
-                        groups.append({
-                            'name': current_group,
-                            'start_row': group_start_row,
-                            'end_row': ws.max_row,
-                            'insert_at': ws.max_row + 1
-                        })
+                    bold_font = Font(bold=True)
+                    subtotal_fill = _solid_fill(SUBTOTAL_FILL_COLOR)
                     
-                    logger.info(f"  📊 Found {len(groups)} groups for subtotals")
+                    # Label with the value as stored in the sheet (first row of the group), read before rows move
+                    group_names = [ws.cell(row=group['label_row'], column=group_col_idx).value for group in groups]
                     
-                    # Insert subtotal rows (in reverse)
-                    for group in reversed(groups):
-                        insert_row = group['insert_at']
-                        group_name = group['name']
-                        start_row = group['start_row']
-                        end_row = group['end_row']
+                    # Open every subtotal row at once, then fill them in
+                    insert_rows = self._insert_sheet_rows(ws, [group['end_row'] + 1 for group in groups])
+                    for group, group_name, insert_row in zip(groups, group_names, insert_rows):
+                        calculated_value = group['value']
                         
-                        ws.insert_rows(insert_row)
                         ws.cell(row=insert_row, column=group_col_idx, value=f"{group_name} Count")
                         
-                        # Calculate value
-                        if function == 'COUNT':
-                            calculated_value = sum(1 for r in range(start_row, end_row + 1) 
-                                                   if ws.cell(row=r, column=agg_col_idx).value is not None)
-                        elif function == 'SUM':
-                            calculated_value = sum(float(ws.cell(row=r, column=agg_col_idx).value or 0) 
-                                                   for r in range(start_row, end_row + 1))
-                        else:  # AVERAGE
-                            values = [float(ws.cell(row=r, column=agg_col_idx).value or 0) 
-                                     for r in range(start_row, end_row + 1)]
-                            calculated_value = sum(values) / len(values) if values else 0
-                        
                         # Set numeric value
                         cell = ws.cell(row=insert_row, column=agg_col_idx)
                         cell.value = calculated_value
@@ -1889,8 +3189,8 @@ Generate intelligent, comprehensive Python code:
                         # Format subtotal row
                         for col in range(1, ws.max_column + 1):
                             cell = ws.cell(row=insert_row, column=col)
-                            cell.font = Font(bold=True)
-                            cell.fill = PatternFill(start_color='FFE0E0E0', end_color='FFE0E0E0', fill_type='solid')
+                            cell.font = bold_font
+                            cell.fill = subtotal_fill
                         
                         logger.info(f"  ➕ Subtotal for '{group_name}': {calculated_value} items")
             
@@ -1909,55 +3209,29 @@ Generate intelligent, comprehensive Python code:
                         logger.warning(f"  ⚠️ Column '{column}' not found in {target_sheet}")
                         continue
                     
-                    # Map colors to RGB
-                    color_map = {
-                        'yellow': 'FFFF00',
-                        'red': 'FF0000',
-                        'green': '00FF00',
-                        'blue': '0000FF',
-                        'orange': 'FFA500',
-                        'purple': '800080',
-                        'pink': 'FFC0CB',
-                        'cyan': '00FFFF',
-                        'light_green': '90EE90',
-                        'light_blue': 'ADD8E6',
-                        'light_yellow': 'FFFFE0',
-                        'light_red': 'FFB6C1',
-                        'gray': '808080'
-                    }
-                    
-                    fill_color = color_map.get(color, 'FFFF00')
-                    fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type='solid')
-                    
-                    # Get column index
-                    col_idx = list(target_df.columns).index(column) + 1
+                    fill = _solid_fill(HIGHLIGHT_COLORS.get(color, 'FFFF00'))
                     
                     # Apply highlighting to matching rows
                     operator = condition.get('operator', '==')
                     value = condition.get('value')
+                    mask = self._highlight_condition_mask(target_df[column], operator, value)
                     
-                    for row_idx, cell_value in enumerate(target_df[column], start=2):  # Start at row 2 (after header)
-                        should_highlight = False
-                        
-                        if operator == '==':
-                            should_highlight = str(cell_value) == str(value)
-                        elif operator == '!=':
-                            should_highlight = str(cell_value) != str(value)
-                        elif operator == 'contains':
-                            should_highlight = str(value).lower() in str(cell_value).lower()
-                        elif operator == 'in':
-                            should_highlight = str(cell_value) in [str(v) for v in value]
-                        
-                        if should_highlight:
-                            # Apply fill to entire row
-                            for col in range(1, len(target_df.columns) + 1):
-                                ws.cell(row=row_idx, column=col).fill = fill
-                            logger.info(f"  🎨 Highlighted row {row_idx} in {color}")
+                    # Row 1 is the header, so DataFrame position i is sheet row i + 2
+                    num_columns = len(target_df.columns)
+                    matching_rows = np.flatnonzero(mask) + 2
+                    for row_idx in matching_rows:
+                        # Apply fill to entire row
+                        for cell in ws[int(row_idx)][:num_columns]:
+                            cell.fill = fill
+                    logger.info(f"  🎨 Highlighted {len(matching_rows)} rows in {color}")
             
             # Save workbook
             wb.save(output_path)
             wb.close()
             
+            if write_sheet_cache:
+                self._write_sheet_cache(output_path, sheets)
+            
             logger.info(f"✅ Formatting applied successfully: {filename}")
             
             # Update tracking
@@ -1970,6 +3244,8 @@ Generate intelligent, comprehensive Python code:
                 "timestamp": datetime.now().isoformat(),
                 "operation": "formatting"
             }
+            if write_sheet_cache:
+                self._remember_last_file_sheets(self.session_data[session_id]["last_generated_file"], sheets)
             
             self.session_data[session_id]["generated_files_history"].append({
                 "filename": filename,
@@ -1982,24 +3258,13 @@ Generate intelligent, comprehensive Python code:
             total_rows = sum(len(s["df"]) for s in sheets)
             summary = f"✅ Applied operations in '{target_sheet}' sheet. File has {len(sheets)} sheets ({', '.join([s['sheet_name'] for s in sheets])}) - {total_rows} total rows."
             
-            return {
-                "success": True,
-                "session_id": session_id,
-                "operation_type": "excel_file",
-                "excel_file": filename,
-                "download_url": download_url,
-                "generated_code": "",
-                "explanation": summary,
-                "result": {
-                    "success": True,
-                    "execution_output": summary,
-                    "excel_files": [download_url],
-                    "plots": [],
-                    "dataframes": {},
-                    "variables": {}
-                },
-                "data_shape": f"{len(sheets)} sheets, {total_rows} total rows"
-            }
+            return self._excel_file_response(
+                session_id,
+                filename,
+                download_url,
+                summary,
+                f"{len(sheets)} sheets, {total_rows} total rows"
+            )
             
         except Exception as e:
             logger.error(f"❌ Error applying formatting to multi-sheet file: {e}", exc_info=True)
@@ -2008,6 +3273,46 @@ Generate intelligent, comprehensive Python code:
                 "error": f"Failed to apply formatting: {str(e)}"
             }
     
+    def _excel_file_response(
+        self,
+        session_id: str,
+        excel_file: str,
+        download_url: str,
+        summary: str,
+        data_shape: str,
+        user_query: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Success response for an operation whose output is a downloadable Excel file"""
+        response = {"success": True, "session_id": session_id}
+        if user_query is not None:
+            response["query"] = user_query
+        response.update({
+            "operation_type": "excel_file",
+            "excel_file": excel_file,
+            "download_url": download_url,
+            "generated_code": "",
+            "explanation": summary,
+            "result": {
+                "success": True,
+                "execution_output": summary,
+                "excel_files": [download_url],
+                "plots": [],
+                "dataframes": {},
+                "variables": {}
+            },
+            "data_shape": data_shape
+        })
+        return response
+    
+    def _insert_sheet_rows(self, ws, before_rows: List[int]) -> List[int]:
+        """
+        Insert one blank row before each of the given (ascending, original) row numbers
+        Inserts bottom-up so the earlier row numbers stay valid; returns the row numbers of the inserted rows
+        """
+        for row_idx in reversed(before_rows):
+            ws.insert_rows(row_idx)
+        return [row_idx + offset for offset, row_idx in enumerate(before_rows)]
+    
     def _save_updated_multi_sheet_file(
         self,
         session_id: str,
@@ -2019,9 +3324,8 @@ Generate intelligent, comprehensive Python code:
         Save updated multi-sheet file with all sheets preserved
         """
         try:
-            from datetime import datetime
-            
-            timestamp = int(datetime.now().timestamp())
+            session = self.session_data[session_id]
+            timestamp = _next_file_id()
             filename = f"excel_updated_{timestamp}.xlsx"
             output_path = Path(self.outputs_dir) / filename
             
@@ -2029,7 +3333,7 @@ Generate intelligent, comprehensive Python code:
             
             # Check if source file has formatting (from last_generated_file)
             source_file = None
-            last_file = self.session_data[session_id].get("last_generated_file")
+            last_file = session.get("last_generated_file")
             if last_file and last_file.get("path"):
                 source_path = Path(last_file["path"])
                 # Preserve formatting from any multi-sheet file (merged, formatted, or updated)
@@ -2039,10 +3343,7 @@ Generate intelligent, comprehensive Python code:
             
             if source_file:
                 # Preserve formatting by loading source file with openpyxl
-                import openpyxl
-                from openpyxl.utils.dataframe import dataframe_to_rows
-                
-                wb = openpyxl.load_workbook(source_file)
+                wb = self._open_source_for_update(source_file)
                 
                 # Update each sheet's data while preserving formatting
                 for sheet_info in sheets:
@@ -2063,68 +3364,82 @@ Generate intelligent, comprehensive Python code:
                             ws.delete_rows(new_row_count + 2, rows_to_delete)
                         
                         # Update existing cells with new data (preserves formatting)
-                        for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=False), start=2):
-                            for c_idx, value in enumerate(row, start=1):
-                                cell = ws.cell(row=r_idx, column=c_idx)
+                        data_rows = ws.iter_rows(min_row=2, max_row=new_row_count + 1, max_col=len(df.columns))
+                        for ws_row, values in zip(data_rows, df.itertuples(index=False, name=None)):
+                            for cell, value in zip(ws_row, values):
                                 cell.value = value
-                                # Keep existing formatting (fill, font, etc.)
                         
                         logger.info(f"  ✅ Updated sheet '{sheet_name}': {len(df)} rows (formatting preserved)")
                     else:
                         # Sheet doesn't exist in source, add it normally
                         ws = wb.create_sheet(sheet_name)
-                        for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), start=1):
-                            for c_idx, value in enumerate(row, start=1):
-                                ws.cell(row=r_idx, column=c_idx, value=value)
+                        ws.append(list(df.columns))
+                        for values in df.itertuples(index=False, name=None):
+                            ws.append(values)
                         logger.info(f"  ✅ Added new sheet '{sheet_name}': {len(df)} rows")
                 
                 wb.save(output_path)
                 wb.close()
             else:
-                # No formatting to preserve, use pandas (faster)
-                with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                    for sheet in sheets:
-                        sheet["df"].to_excel(
-                            writer,
-                            sheet_name=sheet["sheet_name"],
-                            index=False
-                        )
-                        logger.info(f"  ✅ Saved sheet '{sheet['sheet_name']}': {len(sheet['df'])} rows")
+                saved_fast = False
+                if FASTEXCEL_AVAILABLE:
+                    # No formatting to preserve, bulk-write every sheet from Arrow buffers
+                    try:
+                        writer = FastExcel(str(output_path))
+                        for sheet in sheets:
+                            writer.sheet(sheet["sheet_name"], sheet["df"])
+                            logger.info(f"  ✅ Saved sheet '{sheet['sheet_name']}': {len(sheet['df'])} rows")
+                        writer.save()
+                        saved_fast = True
+                    except Exception as e:
+                        # e.g. mixed-type object columns Arrow can't convert - drop any partial file
+                        logger.warning(f"⚠️ FastExcel write failed, falling back to pandas writer: {e}")
+                        output_path.unlink(missing_ok=True)
+                
+                if not saved_fast:
+                    # No formatting to preserve, use pandas (faster)
+                    with self._plain_excel_writer(output_path) as writer:
+                        for sheet in sheets:
+                            sheet["df"].to_excel(
+                                writer,
+                                sheet_name=sheet["sheet_name"],
+                                index=False
+                            )
+                            logger.info(f"  ✅ Saved sheet '{sheet['sheet_name']}': {len(sheet['df'])} rows")
+            
+            now_iso = datetime.now().isoformat()
+            sheet_names_list = [s["sheet_name"] for s in sheets]
+            total_rows = sum(len(s["df"]) for s in sheets)
             
             # Update last_generated_file tracking
-            self.session_data[session_id]["last_generated_file"] = {
+            session["last_generated_file"] = {
                 "filename": filename,
                 "path": str(output_path),
                 "type": "updated_multi_sheet",
-                "sheets": [s["sheet_name"] for s in sheets],
-                "timestamp": datetime.now().isoformat(),
+                "sheets": sheet_names_list,
+                "timestamp": now_iso,
                 "operation": "update"
             }
+            self._remember_last_file_sheets(session["last_generated_file"], sheets)
             
             # Add to generated files history
-            self.session_data[session_id]["generated_files_history"].append({
+            session["generated_files_history"].append({
                 "filename": filename,
                 "path": str(output_path),
                 "type": "updated_multi_sheet",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             })
             
             logger.info(f"📌 Tracked updated file: {filename}")
             
             # Generate summary
-            total_rows = sum(len(s["df"]) for s in sheets)
-            sheet_names = ", ".join(s["sheet_name"] for s in sheets)
+            sheet_names = ", ".join(sheet_names_list)
             
             # Determine operation description
-            operation_desc = []
-            if operations.get('remove_last_row'):
-                operation_desc.append("Removed last row")
-            if 'delete_rows' in operations:
-                operation_desc.append("Deleted rows")
-            if 'filter' in operations:
-                operation_desc.append("Filtered data")
-            if 'sort' in operations:
-                operation_desc.append("Sorted data")
+            operation_desc = [
+                desc for key, desc in UPDATE_OPERATION_DESCRIPTIONS
+                if operations.get(key) not in (None, False)
+            ]
             
             op_text = " and ".join(operation_desc) if operation_desc else "Applied operations"
             
@@ -2137,33 +3452,22 @@ Generate intelligent, comprehensive Python code:
             download_url = f"/api/download/{filename}"
             
             # Store in conversation history
-            self.session_data[session_id]["conversation_history"].append({
+            session["conversation_history"].append({
                 "user_query": user_query,
                 "operation_type": "multi_sheet_update",
                 "sheets_updated": len(sheets),
                 "excel_file": filename,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             })
             
-            return {
-                "success": True,
-                "session_id": session_id,
-                "query": user_query,
-                "operation_type": "excel_file",
-                "excel_file": filename,
-                "download_url": download_url,
-                "generated_code": "",
-                "explanation": summary,
-                "result": {
-                    "success": True,
-                    "execution_output": summary,
-                    "excel_files": [download_url],
-                    "plots": [],
-                    "dataframes": {},
-                    "variables": {}
-                },
-                "data_shape": f"{len(sheets)} sheets, {total_rows} total rows"
-            }
+            return self._excel_file_response(
+                session_id,
+                filename,
+                download_url,
+                summary,
+                f"{len(sheets)} sheets, {total_rows} total rows",
+                user_query=user_query
+            )
             
         except Exception as e:
             logger.error(f"❌ Error saving updated multi-sheet file: {e}", exc_info=True)
@@ -2172,6 +3476,31 @@ Generate intelligent, comprehensive Python code:
                 "error": f"Failed to save updated file: {str(e)}"
             }
     
+    def _get_last_file_sheet_names(self, last_file: Dict[str, Any]) -> List[str]:
+        """
+        Sheet names of a generated file, probing the workbook only when they were not tracked
+        (legacy entries and single-sheet outputs whose sheets come from a preserved source workbook)
+        The probed names are stored back on last_file so sequential operations skip the probe
+        """
+        if "sheets" in last_file:
+            return last_file["sheets"] or []
+        file_path = Path(last_file["path"]) if last_file.get("path") else None
+        if file_path is None or not file_path.exists():
+            return []
+        try:
+            if file_path.suffix.lower() in ('.xlsx', '.xlsm'):
+                sheet_names = _xlsx_sheet_names(file_path)
+            else:
+                with self._open_excel_file(file_path) as xl_file:
+                    sheet_names = list(xl_file.sheet_names)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read sheet names from {file_path.name}: {e}")
+            return []
+        last_file["sheets"] = sheet_names
+        if len(sheet_names) > 1:
+            logger.info(f"  ✅ Detected multi-sheet file with {len(sheet_names)} sheets")
+        return sheet_names
+    
     def _handle_excel_operation(
         self,
         session_id: str,
@@ -2189,16 +3518,15 @@ Generate intelligent, comprehensive Python code:
             is_google_sheet = False
             google_sheet_url = None
             
-            if session_id in self.session_data:
-                files = self.session_data[session_id].get("files", {})
-                
-                # Check all files for Google Sheets source
-                for file_id, file_info in files.items():
-                    if file_info.get("source_type") == "google_sheets":
-                        is_google_sheet = True
-                        google_sheet_url = file_info.get("spreadsheet_url")
-                        logger.info(f"📊 Detected Google Sheets source at start: {google_sheet_url}")
-                        break  # Found a Google Sheet, use it
+            session = self.session_data.get(session_id)
+            if session is not None:
+                # Source flags are kept current whenever the session's files change
+                if "has_google_sheets" not in session:
+                    self._refresh_google_sheets_source(session_id)
+                is_google_sheet = session["has_google_sheets"]
+                google_sheet_url = session["google_sheets_url"]
+                if is_google_sheet:
+                    logger.info(f"📊 Detected Google Sheets source at start: {google_sheet_url}")
             
             # If Google Sheets source detected, route to Google Sheets handler
             if is_google_sheet and google_sheet_url:
@@ -2224,19 +3552,23 @@ Generate intelligent, comprehensive Python code:
                 
                 if result.get('success'):
                     # Return Google Sheets response
+                    n_rows, n_cols = df.shape
+                    rows = result.get('rows', n_rows)
+                    columns = result.get('columns', n_cols)
+                    operations_applied = result.get('operations_applied', [])
                     return {
                         "success": True,
                         "type": "google_sheet_operation",
                         "sheet_url": result['sheet_url'],
                         "original_url": result['original_url'],
-                        "operations_applied": result.get('operations_applied', []),
-                        "rows": result.get('rows', len(df)),
-                        "columns": result.get('columns', len(df.columns)),
+                        "operations_applied": operations_applied,
+                        "rows": rows,
+                        "columns": columns,
                         "message": self._generate_operation_success_message(
-                            operations_applied=result.get('operations_applied', []),
+                            operations_applied=operations_applied,
                             user_query=user_query,
-                            rows=result.get('rows', len(df)),
-                            columns=result.get('columns', len(df.columns)),
+                            rows=rows,
+                            columns=columns,
                             sheet_type="Google Sheet"
                         )
                     }
@@ -2271,8 +3603,8 @@ Generate intelligent, comprehensive Python code:
             
             # AGENTIC FILE SOURCE DETERMINATION
             # Let the LLM decide whether to use last generated file or original files
-            last_file = self.session_data[session_id].get("last_generated_file")
-            conversation_history = self.session_data[session_id].get("conversation_history", [])
+            last_file = session.get("last_generated_file")
+            conversation_history = session.get("conversation_history", [])
             
             file_source_decision = self.intent_parser.determine_file_source_with_llm(
                 user_query=user_query,
@@ -2292,19 +3624,8 @@ Generate intelligent, comprehensive Python code:
                 logger.info(f"📋 Using last_generated_file: {last_file.get('filename')} (type: {last_file.get('type')}, sheets: {last_file.get('sheets')})")
                 
                 # Check if it's a multi-sheet file
-                is_multi_sheet = False
-                if last_file.get("sheets") and len(last_file["sheets"]) > 1:
-                    is_multi_sheet = True
-                elif last_file.get("path"):
-                    file_path = Path(last_file["path"])
-                    if file_path.exists():
-                        try:
-                            xl_file = pd.ExcelFile(file_path)
-                            if len(xl_file.sheet_names) > 1:
-                                is_multi_sheet = True
-                                logger.info(f"  ✅ Detected multi-sheet file with {len(xl_file.sheet_names)} sheets")
-                        except:
-                            pass
+                sheet_names = self._get_last_file_sheet_names(last_file)
+                is_multi_sheet = len(sheet_names) > 1
                 
                 if is_multi_sheet:
                     logger.info(f"🔄 Sequential operation detected - updating last generated file: {last_file['filename']}")
@@ -2313,9 +3634,6 @@ Generate intelligent, comprehensive Python code:
                     all_sheets = self._load_all_sheets_from_last_file(session_id)
                     
                     if all_sheets:
-                        # Import the operations function
-                        from .multi_sheet_handler import _apply_operations_to_dataframe
-                        
                         # Check if this is a formatting operation (highlighting, conditional format)
                         is_formatting_op = any(key in operations for key in ['highlight_rows', 'highlight_cells', 'conditional_format'])
                         
@@ -2341,9 +3659,13 @@ Generate intelligent, comprehensive Python code:
                         # Apply operations based on scope
                         if apply_to_all_sheets:
                             logger.info(f"  📊 Applying to ALL {len(all_sheets)} sheets")
-                            # Apply to all sheets
-                            for sheet in all_sheets:
-                                sheet["df"] = _apply_operations_to_dataframe(sheet["df"], operations)
+                            # Apply to all sheets - independent frames, processed on the shared sheet pool
+                            updated_frames = self._run_per_sheet(
+                                _apply_operations_to_dataframe,
+                                [(sheet["df"], operations) for sheet in all_sheets]
+                            )
+                            for sheet, updated_df in zip(all_sheets, updated_frames):
+                                sheet["df"] = updated_df
                         
                         elif target_sheet:
                             logger.info(f"  📄 Applying to target sheet: '{target_sheet}'")
@@ -2402,15 +3724,18 @@ Generate intelligent, comprehensive Python code:
                         logger.info(f"  📋 Previous operations: {last_file.get('operations', {})}")
                         try:
                             # Use header detection for last generated files to handle files with title rows
-                            header_row = self._detect_header_row(last_file_path)
-                            df = pd.read_excel(last_file_path, header=header_row)
+                            with self._open_excel_file(last_file_path) as last_xl_file:
+                                first_sheet = last_xl_file.sheet_names[0]
+                                header_row = self._detect_header_row(last_xl_file, first_sheet)
+                                df = pd.read_excel(last_xl_file, sheet_name=first_sheet, header=header_row)
                             logger.info(f"  ✅ Loaded: {len(df)} rows × {len(df.columns)} columns (header at row {header_row})")
                             # Log first few rows to verify sort order
                             if 'sort' in str(last_file.get('operations', {})):
                                 logger.info(f"  📊 Data preview (first 3 rows to verify sort order):")
-                                for idx, row in df.head(3).iterrows():
-                                    # Only log the first few columns to avoid clutter
-                                    preview = {k: v for k, v in list(dict(row).items())[:3]}
+                                # Only log the first few columns to avoid clutter
+                                preview_df = df.iloc[:3, :3]
+                                for idx, values in zip(preview_df.index, preview_df.itertuples(index=False, name=None)):
+                                    preview = dict(zip(preview_df.columns, values))
                                     logger.info(f"    Row {idx}: {preview}...")
                         except Exception as e:
                             logger.warning(f"  ⚠️ Could not load last file: {e}, using session DataFrame")
@@ -2424,7 +3749,7 @@ Generate intelligent, comprehensive Python code:
                 logger.info(f"📁 Using original uploaded files (session DataFrame)")
                 
                 # CRITICAL FIX: Check if this is a multi-sheet operation BEFORE getting combined DataFrame
-                files = self.session_data[session_id]["files"]
+                files = session["files"]
                 has_multi_sheets = any(file_data.get("is_sheet", False) for file_data in files.values())
                 
                 if has_multi_sheets and (target_sheet or apply_to_all_sheets):
@@ -2433,7 +3758,6 @@ Generate intelligent, comprehensive Python code:
                     logger.info(f"  📊 Apply to all: {apply_to_all_sheets}")
                     
                     # Use multi-sheet handler to preserve original structure
-                    from .multi_sheet_handler import handle_multi_sheet_operation
                     return handle_multi_sheet_operation(
                         self.session_data,
                         session_id,
@@ -2446,14 +3770,13 @@ Generate intelligent, comprehensive Python code:
                     df = self.get_active_dataframe(session_id)
             
             # Generate filename based on operation type or custom name
-            import time
-            timestamp = int(time.time())
+            timestamp = _next_file_id()
             
             # Check if user specified a custom filename
             if 'custom_filename' in operations and operations['custom_filename']:
                 custom_name = operations['custom_filename']
                 # Clean the custom name (remove special chars, keep alphanumeric and underscores)
-                custom_name_clean = ''.join(c for c in custom_name if c.isalnum() or c in ('_', '-')).strip()
+                custom_name_clean = FILENAME_UNSAFE_CHARS.sub('', custom_name).strip()
                 if custom_name_clean:
                     filename = f"{custom_name_clean}_{timestamp}.xlsx"
                     logger.info(f"📝 Using custom filename: {filename}")
@@ -2477,7 +3800,7 @@ Generate intelligent, comprehensive Python code:
                         else:
                             val = str(first_cond)[:20]
                         # Clean value for filename (remove special chars)
-                        val_clean = ''.join(c for c in val if c.isalnum() or c in (' ', '_')).replace(' ', '_')
+                        val_clean = FILTER_VALUE_UNSAFE_CHARS.sub('', val).replace(' ', '_')
                         filter_desc = f"_{first_col}_{val_clean}"
                         op_type = "filtered"
                 
@@ -2492,9 +3815,9 @@ Generate intelligent, comprehensive Python code:
             
             # Determine source file path for format preservation
             source_file_path = None
-            if session_id in self.session_data:
+            if session is not None:
                 # PRIORITY 1: Use last generated file if it exists (for sequential operations)
-                last_file = self.session_data[session_id].get("last_generated_file")
+                last_file = session.get("last_generated_file")
                 if last_file and last_file.get("path"):
                     last_file_path = Path(last_file["path"])
                     if last_file_path.exists():
@@ -2503,10 +3826,10 @@ Generate intelligent, comprehensive Python code:
                 
                 # PRIORITY 2: Use session files if no last generated file
                 if not source_file_path:
-                    files = self.session_data[session_id].get("files", {})
+                    files = session.get("files", {})
                     if files:
                         # Use the first file's path (or active file if set)
-                        active_file = self.session_data[session_id].get("active_file")
+                        active_file = session.get("active_file")
                         if active_file and active_file in files:
                             source_file_path = files[active_file].get("file_path")
                         else:
@@ -2532,56 +3855,46 @@ Generate intelligent, comprehensive Python code:
             operation_summary = self._generate_operation_summary(operations, df)
             
             # Store in conversation history
-            if session_id in self.session_data:
-                self.session_data[session_id]["conversation_history"].append({
+            if session is not None:
+                now_iso = datetime.now().isoformat()
+                session["conversation_history"].append({
                     "user_query": user_query,
                     "operation_type": "excel_file_generation",
                     "operations": operations,
                     "excel_file": excel_filename,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": now_iso
                 })
                 
                 # Track last generated file for sequential operations
-                self.session_data[session_id]["last_generated_file"] = {
+                session["last_generated_file"] = {
                     "filename": excel_filename,
                     "path": excel_path,
                     "type": "excel_operation",
                     "operations": operations,
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": now_iso,
                     "operation": "excel_operations"
                 }
                 
                 # Add to generated files history
-                self.session_data[session_id]["generated_files_history"].append({
+                session["generated_files_history"].append({
                     "filename": excel_filename,
                     "path": excel_path,
                     "type": "excel_operation",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": now_iso
                 })
                 
                 logger.info(f"📌 Tracked last generated file: {excel_filename}")
             
             logger.info(f"✅ Excel file created: {excel_filename}")
             
-            return {
-                "success": True,
-                "session_id": session_id,
-                "query": user_query,
-                "operation_type": "excel_file",
-                "excel_file": excel_filename,
-                "download_url": download_url,
-                "generated_code": "",  # No code execution for Excel operations
-                "explanation": operation_summary,
-                "result": {
-                    "success": True,
-                    "execution_output": operation_summary,
-                    "excel_files": [download_url],
-                    "plots": [],
-                    "dataframes": {},
-                    "variables": {}
-                },
-                "data_shape": f"{len(df)} rows × {len(df.columns)} columns"
-            }
+            return self._excel_file_response(
+                session_id,
+                excel_filename,
+                download_url,
+                operation_summary,
+                f"{len(df)} rows × {len(df.columns)} columns",
+                user_query=user_query
+            )
             
         except Exception as e:
             logger.error(f"❌ Error handling Excel operation: {e}", exc_info=True)
@@ -2647,33 +3960,35 @@ Generate intelligent, comprehensive Python code:
                     custom_sheet_names = None
                 elif custom_sheet_names:
                     # Create intelligent mapping of filenames to sheet names
-                    available_sheet_names = custom_sheet_names.copy()
+                    # (each name is normalized once; the matching loop only compares the normalized forms)
+                    available_sheet_names = [
+                        (sheet_name, sheet_name.lower().translate(NAME_MATCH_STRIP))
+                        for sheet_name in custom_sheet_names
+                    ]
                     
                     for file_id, file_data in files.items():
                         original_filename = file_data["filename"]
                         matched = False
                         
+                        # Extract base name from filename (remove Output_ prefix and extension)
+                        base_filename = original_filename.lower().replace('output_', '').replace('.xlsx', '').replace('.xls', '').replace('.csv', '').translate(NAME_MATCH_STRIP)
+                        
                         # Try to match sheet name to filename
-                        for sheet_name in available_sheet_names:
-                            # Extract base name from filename (remove Output_ prefix and extension)
-                            base_filename = original_filename.lower().replace('output_', '').replace('.xlsx', '').replace('.xls', '').replace('.csv', '').replace('_', '').replace(' ', '')
-                            base_sheet_name = sheet_name.lower().replace('_', '').replace(' ', '')
-                            
+                        for idx, (sheet_name, base_sheet_name) in enumerate(available_sheet_names):
                             if base_sheet_name in base_filename or base_filename in base_sheet_name:
                                 sheet_name_mapping[file_id] = sheet_name
-                                available_sheet_names.remove(sheet_name)
+                                del available_sheet_names[idx]
                                 matched = True
                                 logger.info(f"📝 Matched '{original_filename}' → sheet '{sheet_name}'")
                                 break
                         
                         if not matched and available_sheet_names:
                             # Fallback: use first available sheet name
-                            sheet_name_mapping[file_id] = available_sheet_names.pop(0)
+                            sheet_name_mapping[file_id] = available_sheet_names.pop(0)[0]
                             logger.info(f"📝 Using sheet name '{sheet_name_mapping[file_id]}' for '{original_filename}' (no match found)")
             
             # Generate filename
-            import time
-            timestamp = int(time.time())
+            timestamp = _next_file_id()
             filename = f"excel_merged_{total_files_to_merge}_files_{timestamp}.xlsx"
             excel_path = self.outputs_dir / filename
             
@@ -2682,21 +3997,17 @@ Generate intelligent, comprehensive Python code:
             
             # Add last generated file first (if merging with it)
             if merge_with_last_file:
-                last_file_path = Path(last_generated_file["path"])
-                if last_file_path.exists():
-                    try:
-                        # Load all sheets from last generated file
-                        xl_file = pd.ExcelFile(last_file_path)
-                        for sheet_name in xl_file.sheet_names:
-                            df_sheet = pd.read_excel(last_file_path, sheet_name=sheet_name)
-                            sheets_to_merge.append({
-                                "df": df_sheet,
-                                "sheet_name": sheet_name,
-                                "source": "last_generated"
-                            })
-                            logger.info(f"📋 Including sheet '{sheet_name}' from last generated file ({len(df_sheet)} rows)")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Could not load last generated file: {e}")
+                # Load all sheets from last generated file in one pass (or from its sheet cache)
+                last_sheets = self._load_all_sheets_from_last_file(session_id)
+                if last_sheets is None:
+                    logger.warning(f"⚠️ Could not load last generated file: {last_generated_file.get('filename')}")
+                for sheet in last_sheets or []:
+                    sheets_to_merge.append({
+                        "df": sheet["df"],
+                        "sheet_name": sheet["sheet_name"],
+                        "source": "last_generated"
+                    })
+                    logger.info(f"📋 Including sheet '{sheet['sheet_name']}' from last generated file ({len(sheet['df'])} rows)")
             
             # Add uploaded files
             for file_id, file_data in files.items():
@@ -2710,17 +4021,10 @@ Generate intelligent, comprehensive Python code:
                     sheet_name = original_filename[:31]
                 
                 # Clean sheet name (remove invalid characters)
-                invalid_chars = ['\\', '/', '*', '?', ':', '[', ']']
-                for char in invalid_chars:
-                    sheet_name = sheet_name.replace(char, '_')
+                sheet_name = SHEET_NAME_INVALID_CHARS.sub('_', sheet_name)
                 
                 # Remove file extension from sheet name if present
-                if sheet_name.endswith('.xlsx'):
-                    sheet_name = sheet_name[:-5]
-                elif sheet_name.endswith('.xls'):
-                    sheet_name = sheet_name[:-4]
-                elif sheet_name.endswith('.csv'):
-                    sheet_name = sheet_name[:-4]
+                sheet_name = SHEET_NAME_EXTENSION.sub('', sheet_name, count=1)
                 
                 sheets_to_merge.append({
                     "df": df,
@@ -2728,17 +4032,35 @@ Generate intelligent, comprehensive Python code:
                     "source": "uploaded"
                 })
             
-            # Create Excel writer and write all sheets
-            with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-                for sheet_data in sheets_to_merge:
-                    df = sheet_data["df"]
-                    sheet_name = sheet_data["sheet_name"]
-                    source = sheet_data["source"]
-                    
-                    # Write DataFrame to sheet
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
-                    
-                    logger.info(f"📄 Added sheet '{sheet_name}' from {source} ({len(df)} rows)")
+            # Generate LLM summary for merge operation - it only needs sheet names and row counts,
+            # so it is requested before the workbook is written and decodes while the file is saved
+            file_list = [f"{sheet_data['sheet_name']} ({len(sheet_data['df'])} rows)" for sheet_data in sheets_to_merge]
+            total_rows = sum(len(sheet_data['df']) for sheet_data in sheets_to_merge)
+            
+            merge_context = ""
+            if merge_with_last_file:
+                merge_context = f"\nNote: Merged with last generated file ({last_generated_file.get('filename')})"
+            
+            # Static instructions first, merge details last, so the prompt prefix is identical across merges
+            prompt = MERGE_SUMMARY_PROMPT_PREFIX + f"""Sheets merged:
+{chr(10).join([f"- {f}" for f in file_list])}
+{merge_context}
+
+Files merged: {len(files)}
+Total sheets: {len(sheets_to_merge)}
+Total rows across all sheets: {total_rows}
+
+Generate the message:"""
+            
+            # Identical merges (same sheets and row counts) reuse the cached summary
+            summary_future = self._summary_executor.submit(
+                self.intent_parser.generate_text, prompt, temperature=0.7, top_p=0.9, top_k=40
+            )
+            
+            # Write all sheets row by row (no pandas to_excel)
+            self._write_sheets_fast(excel_path, sheets_to_merge)
+            # Feather copies let a later reload of this workbook skip the Excel parser
+            self._write_sheet_cache(excel_path, sheets_to_merge)
             
             logger.info(f"✅ Merged {total_files_to_merge} files/sheets into: {filename}")
             
@@ -2753,7 +4075,7 @@ Generate intelligent, comprehensive Python code:
                 # Store as sheet
                 sheet_file_id = f"sheet_{sheet_name}_{idx}"
                 sheet_files[sheet_file_id] = {
-                    "df": df.copy(),
+                    "df": df,
                     "filename": f"{sheet_name}.xlsx",
                     "sheet_name": sheet_name,
                     "is_sheet": True,
@@ -2764,67 +4086,26 @@ Generate intelligent, comprehensive Python code:
             
             # Update session with sheet data
             self.session_data[session_id]["files"] = sheet_files
+            self._refresh_google_sheets_source(session_id)
             logger.info(f"📊 Stored {len(sheet_files)} sheets in session for subsequent operations")
             
             # Generate download URL
             download_url = f"/api/download/{filename}"
             
-            # Generate LLM summary for merge operation
-            file_list = [f"{sheet_data['sheet_name']} ({len(sheet_data['df'])} rows)" for sheet_data in sheets_to_merge]
-            total_rows = sum(len(sheet_data['df']) for sheet_data in sheets_to_merge)
-            
-            merge_context = ""
-            if merge_with_last_file:
-                merge_context = f"\nNote: Merged with last generated file ({last_generated_file.get('filename')})"
-            
-            prompt = f"""You are a helpful data assistant. Generate a brief, specific message about the file merge operation that was just completed.
-
-Sheets merged:
-{chr(10).join([f"- {f}" for f in file_list])}
-{merge_context}
-
-Total sheets: {len(sheets_to_merge)}
-Total rows across all sheets: {total_rows}
-
-Instructions:
-1. Focus on the merge operation details
-2. Mention how many files were merged
-3. Mention that each file is in a separate tab/sheet
-4. Keep it brief (1-2 sentences)
-5. DO NOT use markdown formatting like ** or ###
-6. Use plain text only
-7. You can use emojis like ✅ 📊 📄
-8. DO NOT start with generic phrases like "Okay", "Done", "Ready", "Your file is ready"
-9. Start directly with the merge details
-
-Example format:
-- "✅ Merged {len(files)} files into one workbook with separate tabs - {total_rows} total rows."
-- "📊 Combined {len(files)} files into separate sheets - {total_rows} rows across all data."
-
-Generate the message:"""
-            
             try:
-                import google.generativeai as genai
-                response = self.model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.7,
-                        top_p=0.9,
-                        top_k=40
-                    )
-                )
-                summary = response.text.strip()
+                summary = summary_future.result().strip()
             except Exception as e:
                 logger.error(f"❌ Error generating merge summary: {e}")
                 summary = f"✅ Merged {len(files)} files into one Excel workbook! Each file is in a separate tab. Total: {total_rows} rows."
             
             # Store in conversation history
+            now_iso = datetime.now().isoformat()
             self.session_data[session_id]["conversation_history"].append({
                 "user_query": user_query,
                 "operation_type": "merge_files",
                 "files_merged": len(files),
                 "excel_file": filename,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             })
             
             # Track last generated file for sequential operations
@@ -2833,39 +4114,29 @@ Generate the message:"""
                 "path": str(excel_path),
                 "type": "merged",
                 "sheets": [sheet_data["sheet_name"] for sheet_data in sheet_files.values()],
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
                 "operation": "merge_files"
             }
+            self._remember_last_file_sheets(self.session_data[session_id]["last_generated_file"], sheets_to_merge)
             
             # Add to generated files history
             self.session_data[session_id]["generated_files_history"].append({
                 "filename": filename,
                 "path": str(excel_path),
                 "type": "merged",
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             })
             
             logger.info(f"📌 Tracked last generated file: {filename}")
             
-            return {
-                "success": True,
-                "session_id": session_id,
-                "query": user_query,
-                "operation_type": "excel_file",
-                "excel_file": filename,
-                "download_url": download_url,
-                "generated_code": "",
-                "explanation": summary,
-                "result": {
-                    "success": True,
-                    "execution_output": summary,
-                    "excel_files": [download_url],
-                    "plots": [],
-                    "dataframes": {},
-                    "variables": {}
-                },
-                "data_shape": f"{len(files)} files merged, {total_rows} total rows"
-            }
+            return self._excel_file_response(
+                session_id,
+                filename,
+                download_url,
+                summary,
+                f"{len(files)} files merged, {total_rows} total rows",
+                user_query=user_query
+            )
             
         except Exception as e:
             logger.error(f"❌ Error merging files: {e}", exc_info=True)
@@ -2884,8 +4155,6 @@ Generate the message:"""
         Handle renaming tabs in the last generated Excel file or uploaded file
         """
         try:
-            from openpyxl import load_workbook
-            
             # Get last generated file
             last_file = self.session_data[session_id].get("last_generated_file")
             
@@ -2937,14 +4206,14 @@ Generate the message:"""
             
             logger.info(f"📝 Renaming tabs in file: {source_path.name}")
             
-            # Load the workbook
-            wb = load_workbook(source_path)
             rename_map = operations.get('rename_tabs', {})
             
-            # Get sheet names in order
-            sheet_names = wb.sheetnames
+            # Get sheet names in order - only workbook.xml is read
+            sheet_names = _xlsx_sheet_names(source_path)
             
-            # Apply renames
+            # Resolve renames with openpyxl's title rules (invalid characters rejected, duplicates numbered)
+            renamed_sheet_names = list(sheet_names)
+            rename_steps = []
             renamed_count = 0
             for sheet_key, new_name in rename_map.items():
                 # Extract sheet index from key (e.g., "sheet_0" -> 0)
@@ -2953,20 +4222,38 @@ Generate the message:"""
                         sheet_index = int(sheet_key.split('_')[1])
                         if sheet_index < len(sheet_names):
                             old_name = sheet_names[sheet_index]
-                            ws = wb[old_name]
-                            ws.title = new_name
+                            if not new_name:
+                                raise ValueError("Title must have at least one character")
+                            invalid = INVALID_TITLE_REGEX.search(new_name)
+                            if invalid:
+                                raise ValueError(f"Invalid character {invalid.group(0)} found in sheet title")
+                            if renamed_sheet_names[sheet_index] != new_name:
+                                renamed_sheet_names[sheet_index] = avoid_duplicate_name(renamed_sheet_names, new_name)
+                            rename_steps.append((sheet_index, new_name))
                             logger.info(f"  ✅ Renamed '{old_name}' → '{new_name}'")
                             renamed_count += 1
                     except (ValueError, IndexError, KeyError) as e:
                         logger.warning(f"  ⚠️ Could not rename {sheet_key}: {e}")
             
             # Save to new file
-            timestamp = int(datetime.now().timestamp())
+            timestamp = _next_file_id()
             filename = f"excel_renamed_tabs_{timestamp}.xlsx"
             excel_path = Path(self.outputs_dir) / filename
             
-            wb.save(excel_path)
-            wb.close()
+            # Copy-then-modify: the output starts as a byte copy of the source, so styles, print
+            # settings and cached formula values survive; only the tab names are edited afterwards
+            shutil.copy(source_path, excel_path)
+            try:
+                if renamed_sheet_names != sheet_names:
+                    _rename_tabs_via_zip(excel_path, excel_path, renamed_sheet_names)
+            except Exception as e:
+                logger.info(f"ℹ️ Metadata-only rename not possible ({e}), rewriting workbook with openpyxl")
+                wb = load_workbook(source_path)
+                for sheet_index, new_name in rename_steps:
+                    wb[wb.sheetnames[sheet_index]].title = new_name
+                renamed_sheet_names = wb.sheetnames
+                wb.save(excel_path)
+                wb.close()
             
             logger.info(f"✅ Renamed {renamed_count} tabs in: {filename}")
             
@@ -2976,11 +4263,18 @@ Generate the message:"""
                 "filename": filename,
                 "path": str(excel_path),
                 "type": "renamed_tabs",
-                "sheets": list(rename_map.values()),
+                "sheets": renamed_sheet_names,
                 "timestamp": datetime.now().isoformat(),
                 "operation": "rename_tabs"
             }
             
+            # Sheet contents are unchanged - carry the parsed sheets over under their new names
+            source_sheets = self._recall_last_file_sheets(last_file)
+            if source_sheets is not None and len(source_sheets) == len(renamed_sheet_names):
+                for sheet, new_name in zip(source_sheets, renamed_sheet_names):
+                    sheet["sheet_name"] = new_name
+                self._remember_last_file_sheets(self.session_data[session_id]["last_generated_file"], source_sheets)
+            
             # Add to generated files history
             self.session_data[session_id]["generated_files_history"].append({
                 "filename": filename,
@@ -3003,25 +4297,14 @@ Generate the message:"""
                 "timestamp": datetime.now().isoformat()
             })
             
-            return {
-                "success": True,
-                "session_id": session_id,
-                "query": user_query,
-                "operation_type": "excel_file",
-                "excel_file": filename,
-                "download_url": download_url,
-                "generated_code": "",
-                "explanation": summary,
-                "result": {
-                    "success": True,
-                    "execution_output": summary,
-                    "excel_files": [download_url],
-                    "plots": [],
-                    "dataframes": {},
-                    "variables": {}
-                },
-                "data_shape": f"{renamed_count} tabs renamed"
-            }
+            return self._excel_file_response(
+                session_id,
+                filename,
+                download_url,
+                summary,
+                f"{renamed_count} tabs renamed",
+                user_query=user_query
+            )
             
         except Exception as e:
             logger.error(f"❌ Error renaming tabs: {e}", exc_info=True)
@@ -3045,10 +4328,6 @@ Generate the message:"""
             operations_list = operations_spec['operations']
             logger.info(f"🔄 Processing {len(operations_list)} operations sequentially")
             
-            # Import required for multi-sheet handling
-            from .multi_sheet_handler import handle_multi_sheet_operation
-            import time
-            
             # Check if first operation is merge_files
             if operations_list and operations_list[0].get('merge_files'):
                 logger.info("🔀 First operation is merge_files - executing merge first")
@@ -3076,7 +4355,7 @@ Generate the message:"""
                         if file_data.get("is_sheet", False):
                             sheets_data.append({
                                 "sheet_name": file_data["sheet_name"],
-                                "df": file_data["df"].copy(),
+                                "df": file_data["df"],
                                 "sheet_index": file_data["sheet_index"],
                                 "file_id": file_id
                             })
@@ -3102,7 +4381,7 @@ Generate the message:"""
                 if file_data.get("is_sheet", False):
                     sheets_data.append({
                         "sheet_name": file_data["sheet_name"],
-                        "df": file_data["df"].copy(),
+                        "df": file_data["df"],
                         "sheet_index": file_data["sheet_index"],
                         "file_id": file_id
                     })
@@ -3122,7 +4401,7 @@ Generate the message:"""
                 # Create Excel file with final result
                 # AGENTIC APPROACH: LLM already generated correct format with validation
                 # No manual transformation needed - use operations_spec directly
-                timestamp = int(time.time())
+                timestamp = _next_file_id()
                 filename = f"excel_multi_op_{timestamp}.xlsx"
                 
                 # Try to create Excel file with retry on error
@@ -3155,24 +4434,13 @@ Generate the message:"""
                 download_url = f"/api/download/{Path(excel_path).name}"
                 summary = f"✅ Applied {len(operations_list)} operations - {len(result_df)} rows × {len(result_df.columns)} columns"
                 
-                return {
-                    "success": True,
-                    "session_id": session_id,
-                    "operation_type": "excel_file",
-                    "excel_file": Path(excel_path).name,
-                    "download_url": download_url,
-                    "generated_code": "",
-                    "explanation": summary,
-                    "result": {
-                        "success": True,
-                        "execution_output": summary,
-                        "excel_files": [download_url],
-                        "plots": [],
-                        "dataframes": {},
-                        "variables": {}
-                    },
-                    "data_shape": f"{len(result_df)} rows × {len(result_df.columns)} columns"
-                }
+                return self._excel_file_response(
+                    session_id,
+                    Path(excel_path).name,
+                    download_url,
+                    summary,
+                    f"{len(result_df)} rows × {len(result_df.columns)} columns"
+                )
             
             # Multi-sheet file - process each operation
             logger.info(f"📊 Multi-sheet file detected: {len(sheets_data)} sheets")
@@ -3184,11 +4452,7 @@ Generate the message:"""
                 if operation.get('apply_to_all_sheets'):
                     # Apply to all sheets
                     logger.info(f"  → Applying to ALL sheets")
-                    for sheet_info in sheets_data:
-                        sheet_info["df"] = self._apply_single_operation_to_df(
-                            sheet_info["df"],
-                            operation
-                        )
+                    self._apply_operation_to_all_sheets(sheets_data, operation)
                 
                 elif 'target_sheet' in operation:
                     # Apply to specific sheet
@@ -3206,14 +4470,10 @@ Generate the message:"""
                 else:
                     # No target specified - apply to all sheets
                     logger.info(f"  → No target specified, applying to ALL sheets")
-                    for sheet_info in sheets_data:
-                        sheet_info["df"] = self._apply_single_operation_to_df(
-                            sheet_info["df"],
-                            operation
-                        )
+                    self._apply_operation_to_all_sheets(sheets_data, operation)
             
             # Create multi-sheet Excel file with all processed sheets
-            timestamp = int(time.time())
+            timestamp = _next_file_id()
             filename = f"excel_multi_op_{timestamp}.xlsx"
             output_path = Path(self.outputs_dir) / filename
             
@@ -3266,24 +4526,13 @@ Generate the message:"""
                 
                 logger.info(f"📌 Tracked last generated file: {filename}")
             
-            return {
-                "success": True,
-                "session_id": session_id,
-                "operation_type": "excel_file",
-                "excel_file": filename,
-                "download_url": download_url,
-                "generated_code": "",
-                "explanation": summary,
-                "result": {
-                    "success": True,
-                    "execution_output": summary,
-                    "excel_files": [download_url],
-                    "plots": [],
-                    "dataframes": {},
-                    "variables": {}
-                },
-                "data_shape": f"{len(sheets_data)} sheets, {total_rows} total rows"
-            }
+            return self._excel_file_response(
+                session_id,
+                filename,
+                download_url,
+                summary,
+                f"{len(sheets_data)} sheets, {total_rows} total rows"
+            )
             
         except Exception as e:
             logger.error(f"❌ Error in multi-operation request: {e}", exc_info=True)
@@ -3292,6 +4541,24 @@ Generate the message:"""
                 "error": f"Failed to process multi-operation request: {str(e)}"
             }
     
+    def _apply_operation_to_all_sheets(self, sheets_data: List[Dict], operation: Dict[str, Any]):
+        """Apply one operation to every sheet in place; sheets are independent, so they run on the shared sheet pool"""
+        updated_frames = self._run_per_sheet(
+            self._apply_single_operation_to_df,
+            [(sheet_info["df"], operation) for sheet_info in sheets_data]
+        )
+        for sheet_info, updated_df in zip(sheets_data, updated_frames):
+            sheet_info["df"] = updated_df
+    
+    def _comparison_mask(self, values: pd.Series, op: str, value: Any) -> Optional[pd.Series]:
+        """Row mask for a filter/delete condition; None for an operator we don't support"""
+        if op == 'in':
+            return values.isin(value if isinstance(value, list) else [value])
+        compare = COMPARISON_OPERATORS.get(op)
+        if compare is None:
+            return None
+        return compare(values, value)
+    
     def _apply_single_operation_to_df(self, df: pd.DataFrame, operation: Dict[str, Any]) -> pd.DataFrame:
         """Apply a single operation to a DataFrame"""
         df_result = df.copy()
@@ -3320,27 +4587,11 @@ Generate the message:"""
                 condition = delete_spec['condition']
                 
                 if column in df_result.columns:
-                    operator = condition.get('operator', '==')
-                    value = condition.get('value')
-                    
-                    if operator == '==':
-                        mask = df_result[column] == value
-                    elif operator == '!=':
-                        mask = df_result[column] != value
-                    elif operator == 'in':
-                        mask = df_result[column].isin(value if isinstance(value, list) else [value])
-                    elif operator == '>':
-                        mask = df_result[column] > value
-                    elif operator == '<':
-                        mask = df_result[column] < value
-                    elif operator == '>=':
-                        mask = df_result[column] >= value
-                    elif operator == '<=':
-                        mask = df_result[column] <= value
-                    else:
-                        mask = pd.Series([False] * len(df_result))
-                    
-                    df_result = df_result[~mask]
+                    mask = self._comparison_mask(
+                        df_result[column], condition.get('operator', '=='), condition.get('value')
+                    )
+                    if mask is not None:
+                        df_result = df_result[~mask]
             
             logger.info(f"    ✂️ Deleted rows: {rows_before} → {len(df_result)} rows")
         
@@ -3349,26 +4600,17 @@ Generate the message:"""
             filter_ops = op['filter']
             rows_before = len(df_result)
             
+            # AND all column conditions into one mask, then slice the frame once
+            masks = []
             for column, condition in filter_ops.items():
-                if column in df_result.columns:
-                    if isinstance(condition, dict):
-                        operator = condition.get('operator', '==')
-                        value = condition.get('value')
-                        
-                        if operator == '==':
-                            df_result = df_result[df_result[column] == value]
-                        elif operator == '!=':
-                            df_result = df_result[df_result[column] != value]
-                        elif operator == 'in':
-                            df_result = df_result[df_result[column].isin(value if isinstance(value, list) else [value])]
-                        elif operator == '>':
-                            df_result = df_result[df_result[column] > value]
-                        elif operator == '<':
-                            df_result = df_result[df_result[column] < value]
-                        elif operator == '>=':
-                            df_result = df_result[df_result[column] >= value]
-                        elif operator == '<=':
-                            df_result = df_result[df_result[column] <= value]
+                if column in df_result.columns and isinstance(condition, dict):
+                    mask = self._comparison_mask(
+                        df_result[column], condition.get('operator', '=='), condition.get('value')
+                    )
+                    if mask is not None:
+                        masks.append(mask.to_numpy(dtype=bool, na_value=False))
+            if masks:
+                df_result = df_result[np.logical_and.reduce(masks)]
             
             logger.info(f"    🔍 Filtered: {rows_before} → {len(df_result)} rows")
         
@@ -3389,9 +4631,6 @@ Generate the message:"""
     def _apply_freeze_panes_from_operations(self, file_path: Path, operations_list: list, sheets: list):
         """Apply freeze panes from any operation that requested it"""
         try:
-            from openpyxl import load_workbook
-            from openpyxl.utils import get_column_letter
-            
             # Check if any operation has freeze_panes
             freeze_operations = [op for op in operations_list if 'freeze_panes' in op]
             
@@ -3444,10 +4683,6 @@ Generate the message:"""
     def _apply_formatting_operations_to_multi_sheet(self, file_path: Path, operations_list: list, sheets: list):
         """Apply all formatting operations (auto filters, subtotals, highlighting, etc.) to multi-sheet file"""
         try:
-            from openpyxl import load_workbook
-            from openpyxl.styles import PatternFill, Font
-            from openpyxl.utils import get_column_letter
-            
             wb = load_workbook(file_path)
             
             # Apply auto filters to all sheets by default
@@ -3548,9 +4783,6 @@ Generate the message:"""
     def _apply_subtotals_to_sheet(self, ws, df: pd.DataFrame, subtotal_spec: Dict[str, Any]):
         """Apply subtotals to a specific sheet"""
         try:
-            from openpyxl.styles import PatternFill, Font
-            from openpyxl.utils import get_column_letter
-            
             group_by = subtotal_spec.get('group_by')
             aggregate_column = subtotal_spec.get('aggregate_column')
             function = subtotal_spec.get('function', 'count').upper()
@@ -3564,44 +4796,31 @@ Generate the message:"""
             group_col_idx = df.columns.get_loc(group_by) + 1
             agg_col_idx = df.columns.get_loc(aggregate_column) + 1
             
-            # Track group changes
-            current_group = None
-            subtotal_rows = []
+            if ws.max_row - 1 == len(df):
+                source_df = df
+            else:
+                # Sheet no longer mirrors df (e.g. rows already inserted) - read the two columns once
+                column_values = list(zip(*ws.iter_rows(min_row=2, values_only=True))) if ws.max_row > 1 else []
+                source_df = pd.DataFrame({
+                    group_by: column_values[group_col_idx - 1] if len(column_values) >= group_col_idx else [],
+                    aggregate_column: column_values[agg_col_idx - 1] if len(column_values) >= agg_col_idx else []
+                })
+            groups = self._contiguous_subtotal_groups(
+                source_df, group_by, aggregate_column, function, merge_blank_runs=False
+            )
             
-            for row_idx in range(2, ws.max_row + 1):
-                group_value = ws.cell(row=row_idx, column=group_col_idx).value
-                
-                if current_group is not None and group_value != current_group:
-                    subtotal_rows.append((row_idx, current_group))
-                
-                current_group = group_value
+            bold_font = Font(bold=True)
+            subtotal_fill = _solid_fill(SUBTOTAL_FILL_COLOR)
             
-            if current_group is not None:
-                subtotal_rows.append((ws.max_row + 1, current_group))
+            # Group labels come from the sheet before any row moves
+            group_names = [ws.cell(row=group['label_row'], column=group_col_idx).value for group in groups]
             
-            # Insert subtotal rows (in reverse)
-            for insert_row, group_name in reversed(subtotal_rows):
-                ws.insert_rows(insert_row)
-                ws.cell(row=insert_row, column=group_col_idx, value=f"{group_name} Count")
-                
-                # Find range
-                start_row = insert_row - 1
-                while start_row > 1 and ws.cell(row=start_row, column=group_col_idx).value == group_name:
-                    start_row -= 1
-                start_row += 1
-                end_row = insert_row - 1
+            # Open every subtotal row at once, then fill them in
+            insert_rows = self._insert_sheet_rows(ws, [group['end_row'] + 1 for group in groups])
+            for group, group_name, insert_row in zip(groups, group_names, insert_rows):
+                calculated_value = group['value']
                 
-                # Calculate the numeric value
-                if function == 'COUNT':
-                    calculated_value = sum(1 for r in range(start_row, end_row + 1) 
-                                          if ws.cell(row=r, column=agg_col_idx).value is not None)
-                elif function == 'SUM':
-                    calculated_value = sum(float(ws.cell(row=r, column=agg_col_idx).value or 0) 
-                                          for r in range(start_row, end_row + 1))
-                else:  # AVERAGE
-                    values = [float(ws.cell(row=r, column=agg_col_idx).value or 0) 
-                             for r in range(start_row, end_row + 1)]
-                    calculated_value = sum(values) / len(values) if values else 0
+                ws.cell(row=insert_row, column=group_col_idx, value=f"{group_name} Count")
                 
                 # Set the numeric value (not formula)
                 cell = ws.cell(row=insert_row, column=agg_col_idx)
@@ -3611,8 +4830,8 @@ Generate the message:"""
                 # Format
                 for col in range(1, ws.max_column + 1):
                     cell = ws.cell(row=insert_row, column=col)
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color='FFE0E0E0', end_color='FFE0E0E0', fill_type='solid')
+                    cell.font = bold_font
+                    cell.fill = subtotal_fill
                 
         except Exception as e:
             logger.error(f"⚠️ Subtotal application failed: {e}")
@@ -3622,8 +4841,6 @@ Generate the message:"""
         Resolve column reference to actual column name
         Handles both "Column V" and actual names like "RAG Rating"
         """
-        import re
-        
         # If it's already a valid column name, return it
         if column_ref in df.columns:
             return column_ref
@@ -3650,8 +4867,6 @@ Generate the message:"""
     def _apply_highlighting_to_sheet(self, ws, df: pd.DataFrame, hl_spec: Dict[str, Any]):
         """Apply row highlighting to a specific sheet"""
         try:
-            from openpyxl.styles import PatternFill
-            
             column_ref = hl_spec.get('column')
             condition = hl_spec.get('condition', {})
             color = hl_spec.get('color', 'yellow')
@@ -3664,16 +4879,7 @@ Generate the message:"""
                 return
             
             # Color mapping - match Excel's conditional formatting colors
-            color_map = {
-                'red': 'FFC7CE', 'green': 'C6EFCE', 'yellow': 'FFFF99',  # Excel conditional format colors
-                'amber': 'FFEB9C',  # Excel amber/orange for RAG rating
-                'blue': '0000FF', 'orange': 'FFA500', 'purple': '800080',
-                'pink': 'FFC0CB', 'cyan': '00FFFF', 'light_green': '90EE90',
-                'light_blue': 'ADD8E6', 'light_yellow': 'FFFFE0',
-                'light_red': 'FFCCCB', 'gray': 'D3D3D3'
-            }
-            fill_color = color_map.get(color.lower(), 'FFFF99')
-            fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type='solid')
+            fill = _solid_fill(CONDITIONAL_FORMAT_COLORS.get(color.lower(), 'FFFF99'))
             
             col_idx = df.columns.get_loc(column) + 1
             
@@ -3691,8 +4897,6 @@ Generate the message:"""
     def _apply_cell_highlighting_to_sheet(self, ws, df: pd.DataFrame, hl_spec: Dict[str, Any]):
         """Apply cell highlighting to a specific sheet"""
         try:
-            from openpyxl.styles import PatternFill
-            
             column_ref = hl_spec.get('column')
             condition = hl_spec.get('condition', {})
             color = hl_spec.get('color', 'yellow')
@@ -3705,16 +4909,7 @@ Generate the message:"""
                 return
             
             # Color mapping - match Excel's conditional formatting colors
-            color_map = {
-                'red': 'FFC7CE', 'green': 'C6EFCE', 'yellow': 'FFFF99',  # Excel conditional format colors
-                'amber': 'FFEB9C',  # Excel amber/orange for RAG rating
-                'blue': '0000FF', 'orange': 'FFA500', 'purple': '800080',
-                'pink': 'FFC0CB', 'cyan': '00FFFF', 'light_green': '90EE90',
-                'light_blue': 'ADD8E6', 'light_yellow': 'FFFFE0',
-                'light_red': 'FFCCCB', 'gray': 'D3D3D3'
-            }
-            fill_color = color_map.get(color.lower(), 'FFFF99')
-            fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type='solid')
+            fill = _solid_fill(CONDITIONAL_FORMAT_COLORS.get(color.lower(), 'FFFF99'))
             
             col_idx = df.columns.get_loc(column) + 1
             
@@ -3736,25 +4931,15 @@ Generate the message:"""
                 operator = condition.get('operator', '==')
                 target = condition.get('value')
                 
-                if operator == '==':
-                    return value == target
-                elif operator == '!=':
-                    return value != target
-                elif operator == '>':
-                    return value > target
-                elif operator == '<':
-                    return value < target
-                elif operator == '>=':
-                    return value >= target
-                elif operator == '<=':
-                    return value <= target
+                compare = COMPARISON_OPERATORS.get(operator)
+                if compare is not None:
+                    return compare(value, target)
                 elif operator == 'contains':
                     return target in str(value) if value else False
                 elif operator == 'in':
                     return value in target
                 elif operator == 'regex':
                     # Support regex pattern matching
-                    import re
                     if value is None:
                         return False
                     pattern = re.compile(target)
@@ -3941,7 +5126,6 @@ Example format:
 Generate the message:"""
 
         try:
-            import google.generativeai as genai
             response = self.model.generate_content(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
@@ -3981,7 +5165,7 @@ Generate the message:"""
             "total_files": len(files),
             "active_file": session.get("active_file"),
             "data_shape": f"{len(df)} rows × {len(df.columns)} columns",
-            "memory_usage_mb": df.memory_usage(deep=True).sum() / 1024 / 1024,
+            "memory_usage_mb": self._approx_memory_bytes(df) / 1024 / 1024,
             "columns": list(df.columns),
             "conversation_count": len(history),
             "files_info": {
@@ -4031,7 +5215,6 @@ Examples of good messages:
 
 Generate the success message:"""
 
-            import google.generativeai as genai
             response = self.model.generate_content(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
@@ -4101,7 +5284,6 @@ Example format: "✅ Successfully merged files into separate tabs, applied sorti
 
 Generate the success message:"""
 
-            import google.generativeai as genai
             response = self.model.generate_content(
                 prompt,
                 generation_config=genai.types.GenerationConfig(
@@ -4246,6 +5428,7 @@ Generate a helpful response:"""
         """Clear session data from memory"""
         try:
             if session_id in self.session_data:
+                self._delete_gemini_cache(session_id)
                 del self.session_data[session_id]
                 logger.info(f"🗑️ Cleared session: {session_id}")
                 return True
@@ -897,6 +897,8 @@ class GoogleSheetsFormatter:
                 # Update session with sheet data (like Excel does)
                 if hasattr(self, 'session_data') and self.session_id:
                     self.session_data[self.session_id]["files"] = sheet_files
+                    self.session_data[self.session_id]["has_google_sheets"] = True
+                    self.session_data[self.session_id]["google_sheets_url"] = new_sheet_url
                     logger.info(f"📊 Stored {len(sheet_files)} sheets in session for subsequent operations (matching Excel flow)")
             
             return {
@@ -0,0 +1,28 @@
+"""
+Cache Key Hashing
+Fast, non-cryptographic 128-bit fingerprints for internal cache keys
+Uses xxhash (xxh3_128) when installed, otherwise blake2b with a 16-byte digest
+"""
+
+import hashlib
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    xxhash = None
+    XXHASH_AVAILABLE = False
+
+
+def new_hasher():
+    """Create an incremental hasher exposing update() and hexdigest()"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def fingerprint(data: bytes) -> str:
+    """Hex fingerprint of a bytes payload - stable across processes"""
+    hasher = new_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()